@@ -0,0 +1,255 @@
+"""
+A small read-only HTTP API for the lgbce_reviews table
+
+GET /reviews
+    every review, optionally filtered by ?status=, ?register_code=
+    and ?eco_made=. Every response includes last_change: pass that back
+    as ?since=<last_change> to get only the reviews which have changed
+    since then, plus the slugs of any which have been deleted.
+GET /reviews/<slug>
+    a single review
+GET /events
+    a stream of change events (server-sent events). Reconnecting
+    clients send Last-Event-ID to replay anything they missed, or pass
+    ?since=<id> to replay from a given event. By default, the stream
+    starts with the next new event. Streams are closed after
+    STREAM_LIFETIME seconds, so clients should reconnect.
+
+Every response has an ETag, so clients can poll with If-None-Match
+and get a 304 if nothing has changed.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qs
+from urllib.request import pathname2url
+from wsgiref.simple_server import WSGIServer, make_server
+
+from boundary_bot.snapshot import SQLITE_PREFIX
+
+
+REVIEWS_TABLE_NAME = "lgbce_reviews"
+CHANGES_TABLE_NAME = "lgbce_review_changes"
+EVENTS_TABLE_NAME = "lgbce_change_events"
+FILTERS = ("status", "register_code", "eco_made")
+# how often an open event stream checks for new events
+POLL_INTERVAL = 5
+# how long an event stream stays open (in seconds)
+STREAM_LIFETIME = 300
+
+STATUSES = {
+    200: "200 OK",
+    304: "304 Not Modified",
+    400: "400 Bad Request",
+    404: "404 Not Found",
+    405: "405 Method Not Allowed",
+}
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def get_db_path():
+    db_name = os.environ["SCRAPERWIKI_DATABASE_NAME"]
+    if not db_name.startswith(SQLITE_PREFIX):
+        raise ValueError("Can't serve %s" % db_name)
+    return db_name[len(SQLITE_PREFIX) :]
+
+
+def get_path(environ):
+    return environ.get("PATH_INFO", "").rstrip("/")
+
+
+def get_etags(environ):
+    header = environ.get("HTTP_IF_NONE_MATCH", "")
+    return [tag.strip() for tag in header.split(",")]
+
+
+class ReviewsApp:
+
+    """
+    WSGI app serving reviews from SQLite
+
+    Each thread gets its own read-only connection,
+    so the API can never change the data.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.local = threading.local()
+
+    def get_connection(self):
+        if not hasattr(self.local, "connection"):
+            connection = sqlite3.connect(
+                "file:%s?mode=ro" % pathname2url(self.db_path), uri=True
+            )
+            connection.row_factory = sqlite3.Row
+            self.local.connection = connection
+        return self.local.connection
+
+    def select(self, query, params=()):
+        cursor = self.get_connection().execute(query, params)
+        return [OrderedDict(sorted(zip(row.keys(), row))) for row in cursor]
+
+    def get_review(self, slug):
+        rows = self.select(
+            "SELECT * FROM %s WHERE slug=?" % (REVIEWS_TABLE_NAME), [slug]
+        )
+        if not rows:
+            raise ApiError(404, "No review found for '%s'" % slug)
+        return rows[0]
+
+    def get_reviews(self, query):
+        where = []
+        params = []
+        for key in FILTERS:
+            if key not in query:
+                continue
+            value = query[key][-1]
+            if key == "eco_made":
+                if value not in ("0", "1"):
+                    raise ApiError(400, "eco_made must be 0 or 1")
+                value = int(value)
+            where.append("r.%s=?" % key)
+            params.append(value)
+
+        since = query.get("since", [None])[-1]
+        if since is not None:
+            try:
+                since = int(since)
+            except ValueError:
+                raise ApiError(400, "since must be an integer")
+            where.append("c.seq>?")
+            params.append(since)
+
+        reviews = self.select(
+            "SELECT r.* FROM %s r LEFT JOIN %s c ON c.slug=r.slug %s ORDER BY r.slug"
+            % (
+                REVIEWS_TABLE_NAME,
+                CHANGES_TABLE_NAME,
+                "WHERE " + " AND ".join(where) if where else "",
+            ),
+            params,
+        )
+        result = OrderedDict([("reviews", reviews)])
+        if since is not None:
+            result["deleted"] = [
+                row["slug"]
+                for row in self.select(
+                    "SELECT slug FROM %s WHERE deleted=1 AND seq>? ORDER BY slug"
+                    % (CHANGES_TABLE_NAME),
+                    [since],
+                )
+            ]
+        # pass this back as ?since= to get the next set of changes
+        result["last_change"] = self.select(
+            "SELECT IFNULL(MAX(seq), 0) AS last_change FROM %s" % (CHANGES_TABLE_NAME)
+        )[0]["last_change"]
+        return result
+
+    def get_cursor(self, environ):
+        query = parse_qs(environ.get("QUERY_STRING", ""))
+        cursor = environ.get("HTTP_LAST_EVENT_ID") or query.get("since", [None])[-1]
+        if cursor is None:
+            return self.select(
+                "SELECT IFNULL(MAX(id), 0) AS latest FROM %s" % (EVENTS_TABLE_NAME)
+            )[0]["latest"]
+        try:
+            return int(cursor)
+        except ValueError:
+            raise ApiError(400, "Event ids must be integers")
+
+    def get_events(self, cursor):
+        return self.select(
+            "SELECT * FROM %s WHERE id>? ORDER BY id LIMIT 100" % (EVENTS_TABLE_NAME),
+            [cursor],
+        )
+
+    def stream_events(self, cursor):
+        # each stream ties up a server thread, so it doesn't last forever:
+        # the client reconnects with Last-Event-ID and carries on
+        expires = time.monotonic() + STREAM_LIFETIME
+        while True:
+            events = self.get_events(cursor)
+            for event in events:
+                cursor = event["id"]
+                event["review"] = json.loads(event["review"])
+                yield (
+                    "id: %i\nevent: %s\ndata: %s\n\n"
+                    % (event["id"], event["type"], json.dumps(event))
+                ).encode("utf-8")
+            if not events:
+                if time.monotonic() >= expires:
+                    return
+                # a comment, so the client knows we're still here
+                yield b": keepalive\n\n"
+                time.sleep(POLL_INTERVAL)
+
+    def route(self, environ):
+        path = get_path(environ)
+        query = parse_qs(environ.get("QUERY_STRING", ""))
+        if path == "/reviews":
+            return self.get_reviews(query)
+        if path.startswith("/reviews/") and path.count("/") == 2:
+            return self.get_review(path.split("/")[-1])
+        raise ApiError(404, "Not found")
+
+    def __call__(self, environ, start_response):
+        try:
+            status = 200
+            if environ["REQUEST_METHOD"] not in ("GET", "HEAD"):
+                raise ApiError(405, "Method not allowed")
+            if get_path(environ) == "/events":
+                cursor = self.get_cursor(environ)
+                start_response(
+                    STATUSES[200],
+                    [
+                        ("Content-Type", "text/event-stream"),
+                        ("Cache-Control", "no-cache"),
+                    ],
+                )
+                if environ["REQUEST_METHOD"] == "HEAD":
+                    return [b""]
+                return self.stream_events(cursor)
+            data = self.route(environ)
+        except ApiError as e:
+            status = e.status
+            data = {"error": e.message}
+
+        body = json.dumps(data, indent=4).encode("utf-8")
+        etag = '"%s"' % hashlib.sha1(body).hexdigest()
+        if status == 200 and etag in get_etags(environ):
+            status = 304
+            body = b""
+
+        headers = [("ETag", etag)]
+        if status != 304:
+            headers += [
+                ("Content-Type", "application/json"),
+                ("Content-Length", str(len(body))),
+            ]
+        start_response(STATUSES[status], headers)
+        if environ["REQUEST_METHOD"] == "HEAD":
+            return [b""]
+        return [body]
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+def serve(host, port, db_path=None):
+    app = ReviewsApp(db_path or get_db_path())
+    httpd = make_server(host, port, app, server_class=ThreadingWSGIServer)
+    print("Serving on http://%s:%i/reviews" % (host, port))
+    httpd.serve_forever()
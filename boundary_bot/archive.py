@@ -0,0 +1,230 @@
+import datetime
+import logging
+from urllib.parse import urldefrag, urlparse
+
+import scrapy
+import scraperwiki
+from scrapy import signals
+from scrapy.crawler import CrawlerProcess
+from scrapy.spidermiddlewares.httperror import HttpError
+from boundary_bot import db
+from boundary_bot.common import ARCHIVE_START_PAGE
+from boundary_bot.detail_page import DetailPage
+from boundary_bot.search import SearchIndex
+from boundary_bot.spider import LgbceSpider
+
+
+logger = logging.getLogger(__name__)
+
+
+def canonical_url(url):
+    # the frontier is keyed on URL, so drop any #fragment and
+    # only follow links which stay on lgbce.org.uk
+    url = urldefrag(url)[0]
+    host = urlparse(url).hostname or ""
+    if host == "lgbce.org.uk" or host.endswith(".lgbce.org.uk"):
+        return url
+    return None
+
+
+class ArchiveStore:
+
+    """
+    Persistent state for a crawl of the full LGBCE review archive
+
+    The frontier table holds every URL we've queued and whether we've
+    visited it yet. Visits and the records we find are buffered and
+    written out in a checkpoint every CHECKPOINT_EVERY pages, so an
+    interrupted crawl can pick up from the last checkpoint.
+
+    Archive records are kept in their own table: the live lgbce_reviews
+    table is only ever populated from the current reviews page.
+    """
+
+    FRONTIER_TABLE_NAME = "lgbce_archive_frontier"
+    TABLE_NAME = "lgbce_archive"
+    CHECKPOINT_EVERY = 50
+
+    def __init__(self):
+        scraperwiki.sql.execute(
+            """
+            CREATE TABLE IF NOT EXISTS %s (
+                url TEXT PRIMARY KEY,
+                visited INT DEFAULT 0
+            );"""
+            % self.FRONTIER_TABLE_NAME
+        )
+        scraperwiki.sql.execute(
+            """
+            CREATE TABLE IF NOT EXISTS %s (
+                url TEXT PRIMARY KEY,
+                slug TEXT,
+                name TEXT,
+                latest_event TEXT,
+                shapefiles TEXT,
+                eco TEXT,
+                eco_made INT DEFAULT 0,
+                crawled_at TEXT
+            );"""
+            % self.TABLE_NAME
+        )
+        self.search_index = SearchIndex()
+        self.load()
+
+    def load(self):
+        frontier = scraperwiki.sql.select(
+            "url, visited FROM %s" % (self.FRONTIER_TABLE_NAME)
+        )
+        self.queued = set(row["url"] for row in frontier)
+        self.visited = set(row["url"] for row in frontier if row["visited"])
+        self.new_urls = []
+        self.visits = []
+        self.records = []
+
+    def get_pending(self):
+        result = scraperwiki.sql.select(
+            "url FROM %s WHERE visited=0 ORDER BY rowid" % (self.FRONTIER_TABLE_NAME)
+        )
+        return [row["url"] for row in result]
+
+    def add(self, url):
+        # returns True if this is a URL we haven't seen before
+        if url in self.queued:
+            return False
+        self.queued.add(url)
+        self.new_urls.append(url)
+        return True
+
+    def visit(self, url, record=None):
+        self.visited.add(url)
+        self.visits.append(url)
+        if record:
+            self.records.append(record)
+        if len(self.visits) >= self.CHECKPOINT_EVERY:
+            self.checkpoint()
+
+    def checkpoint(self):
+        # Write the new URLs, then the records, then mark pages as visited.
+        # If we're interrupted part way through we'll fetch a page again
+        # on the next run rather than lose it.
+        if self.new_urls:
+            db.execute(
+                "INSERT OR IGNORE INTO %s (url) VALUES (?)"
+                % (self.FRONTIER_TABLE_NAME),
+                [[url] for url in self.new_urls],
+            )
+        if self.records:
+            db.save(unique_keys=["url"], data=self.records, table_name=self.TABLE_NAME)
+            self.search_index.index_archive(self.records)
+        if self.visits:
+            db.execute(
+                "UPDATE %s SET visited=1 WHERE url=?" % (self.FRONTIER_TABLE_NAME),
+                [[url] for url in self.visits],
+            )
+        logger.info(
+            "Checkpoint: visited %i of %i queued URLs",
+            len(self.visited),
+            len(self.queued),
+        )
+        self.new_urls = []
+        self.visits = []
+        self.records = []
+
+    def reset(self):
+        # start the crawl again from scratch
+        # (but keep the records we already have)
+        db.execute("DELETE FROM %s" % (self.FRONTIER_TABLE_NAME))
+        self.load()
+
+
+class LgbceArchiveSpider(LgbceSpider):
+
+    """
+    Spider which walks every page under /all-reviews
+    rather than just the reviews linked from the current reviews page
+    """
+
+    name = "archive"
+
+    def __init__(self, store=None, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.store = store
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        crawler.signals.connect(spider.spider_closed, signal=signals.spider_closed)
+        return spider
+
+    def spider_closed(self, spider):
+        self.store.checkpoint()
+
+    def make_request(self, url):
+        # remember which frontier URL this was, in case we get redirected.
+        # The frontier already de-duplicates URLs (and persists between
+        # runs) so scrapy's dupefilter mustn't drop a URL we've queued
+        return scrapy.Request(
+            url,
+            self.parse,
+            errback=self.request_failed,
+            meta={"frontier_url": url},
+            dont_filter=True,
+        )
+
+    def start_requests(self):
+        pending = self.store.get_pending()
+        if not pending and self.store.visited:
+            self.logger.info("Archive crawl is complete. Use --restart to crawl again")
+        if not pending and not self.store.visited:
+            # this is a new crawl
+            self.store.add(ARCHIVE_START_PAGE)
+            pending = [ARCHIVE_START_PAGE]
+        for url in pending:
+            yield self.make_request(url)
+
+    def request_failed(self, failure):
+        if failure.check(HttpError):
+            # the page is gone: don't keep trying it on every run
+            self.store.visit(failure.request.meta["frontier_url"])
+        # anything else (timeouts, etc) stays in the frontier for next time
+
+    def parse(self, response):
+        page = DetailPage(response.selector.root)
+
+        requests = []
+        for link in page.review_links:
+            url = canonical_url(response.urljoin(link))
+            if url and self.store.add(url):
+                requests.append(self.make_request(url))
+
+        frontier_url = response.meta["frontier_url"]
+        if page.title is None:
+            self.store.visit(frontier_url)
+            return requests
+
+        rec, draft_link = page.get_record(response.url)
+        rec["url"] = response.url
+        rec["name"] = page.get_name()
+        rec["crawled_at"] = datetime.datetime.now().isoformat()
+        if draft_link:
+            # we'll mark the page as visited once we've got the made order
+            requests.append(
+                self.make_draft_request(draft_link, rec, frontier_url=frontier_url)
+            )
+        else:
+            self.store.visit(frontier_url, rec)
+
+        return requests
+
+    def finish_record(self, rec, frontier_url):
+        self.store.visit(frontier_url, rec)
+        return []
+
+
+def crawl_archive(restart=False):
+    store = ArchiveStore()
+    if restart:
+        store.reset()
+    process = CrawlerProcess()
+    process.crawl(LgbceArchiveSpider, store=store)
+    process.start()
@@ -1,4 +1,5 @@
 import csv
+import heapq
 import requests
 from rapidfuzz import process
 
@@ -29,3 +30,16 @@ class CodeMatcher:
             return (code, match, score)
 
         return (None, match, score)
+
+    def get_matches(self, name, limit=5, score_cutoff=0):
+        # the best (code, match, score)s for name, best first.
+        # extract() doesn't sort its results, and with a limit it doesn't
+        # return the best ones either, so we have to ask for all of them
+        matches = heapq.nlargest(
+            limit,
+            process.extract(
+                name, self.names, limit=len(self.names), score_cutoff=score_cutoff
+            ),
+            key=lambda match: match[1],
+        )
+        return [(self.councils_lookup[match], match, score) for match, score in matches]
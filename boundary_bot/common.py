@@ -3,6 +3,7 @@ import os
 
 BASE_URL = "http://www.lgbce.org.uk"
 START_PAGE = BASE_URL + "/current-reviews"
+ARCHIVE_START_PAGE = BASE_URL + "/all-reviews"
 REQUEST_HEADERS = {"Cache-Control": "max-age=20000"}
 
 try:
@@ -15,6 +16,23 @@ try:
 except KeyError:
     GITHUB_API_KEY = None
 
+try:
+    SHAPEFILE_DIR = os.environ["BOUNDARY_BOT_SHAPEFILE_DIR"]
+except KeyError:
+    SHAPEFILE_DIR = "shapefiles"
+
+try:
+    # set this to parse pages in a pool of worker processes
+    PARSE_WORKERS = int(os.environ["BOUNDARY_BOT_PARSE_WORKERS"])
+except KeyError:
+    PARSE_WORKERS = 0
+
+try:
+    # set this to split the crawl across several processes
+    SHARDS = int(os.environ["BOUNDARY_BOT_SHARDS"])
+except KeyError:
+    SHARDS = 1
+
 
 def is_eco(event):
     return "electoral change" in event.lower()
@@ -0,0 +1,18 @@
+import scraperwiki
+
+
+# scraperwiki leaves writes in an open transaction which is rolled back
+# if scraperwiki reflects the schema before it commits (this happens
+# every time with an in-memory database, e.g. as soon as we write to
+# another table) so these wrappers commit writes straight away
+
+
+def execute(query, data=None):
+    result = scraperwiki.sql.execute(query, data)
+    scraperwiki.sql.commit_transactions()
+    return result
+
+
+def save(unique_keys, data, table_name):
+    scraperwiki.sqlite.save(unique_keys=unique_keys, data=data, table_name=table_name)
+    scraperwiki.sql.commit_transactions()
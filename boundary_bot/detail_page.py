@@ -0,0 +1,165 @@
+import re
+from urllib.parse import urljoin
+
+import lxml.html
+from lxml import etree
+from boundary_bot.common import is_eco
+
+
+# Precompiled expressions for the things we need from a review page.
+# Most of these return plain strings rather than elements: creating a
+# Python proxy for every element on the page costs more than the query.
+HREFS = etree.XPath("//body//a/@href", smart_strings=False)
+TITLE = etree.XPath(
+    "(//div[contains(@class, 'field--name-field-accordion-title')])[1]/text()",
+    smart_strings=False,
+)
+BODY = etree.XPath("(//div[contains(@class, 'field--name-field-accordion-body')])[1]")
+MAPPING_HREFS = etree.XPath(
+    "//a[contains(., 'Mapping')][contains(@href, 'inal')]/@href", smart_strings=False
+)
+FOLLOW_HREFS = etree.XPath("//ul/li/div/span/a/@href", smart_strings=False)
+NAME = etree.XPath("string(//h1)")
+STRING_VALUE = etree.XPath("string()")
+
+# if the latest event is an ECO, the accordion body
+# tells us whether it has been made
+ECO_MADE_TEXT = (
+    "have now successfully completed a ",
+    "of parliamentary scrutiny and will come into force",
+)
+
+
+class DetailPage:
+
+    """
+    Links and text extracted from a boundary review page
+
+    Every link on the page is read in one pass and sorted into the
+    categories we care about. The rarer and more expensive lookups
+    (link text, accordion body text) are only made if they are needed.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.zip_links = []
+        self.legislation_links = []
+        self.mapping_links = []
+        self.follow_links = []
+        self.review_links = []
+
+        titles = TITLE(root)
+        self.title = titles[0].strip() if titles else None
+
+        maybe_mapping = False
+        maybe_follow = False
+        for href in HREFS(root):
+            if ".zip" in href:
+                self.zip_links.append(href)
+            if "legislation.gov.uk" in href:
+                self.legislation_links.append(href)
+            if "inal" in href:
+                maybe_mapping = True
+            if "all-reviews" in href:
+                self.review_links.append(href)
+                maybe_follow = True
+
+        if maybe_mapping:
+            self.mapping_links = MAPPING_HREFS(root)
+        if maybe_follow:
+            self.follow_links = [
+                href for href in FOLLOW_HREFS(root) if "all-reviews" in href
+            ]
+
+    def get_name(self):
+        return " ".join(NAME(self.root).split())
+
+    def get_body_text(self):
+        # text of the most recent accordion body,
+        # lower-cased with whitespace (including &nbsp;) collapsed
+        body = BODY(self.root)
+        if not body:
+            return ""
+        return " ".join(STRING_VALUE(body[0]).lower().split())
+
+    def get_shapefiles(self):
+        # find any links to zip files in the page
+        zipfiles = list(set(self.zip_links))
+        if len(zipfiles) == 1:
+            # if we found exactly one link to a zipfile,
+            # assume that's what we're looking for
+            return zipfiles[0]
+
+        # Try being more specific
+        if len(self.mapping_links) == 1:
+            return self.mapping_links[0]
+
+        return None
+
+    def get_legislation(self):
+        # find any links to legislation.gov.uk in the page
+        # returns a tuple of (made_link, draft_link)
+        legislation_links = set(self.legislation_links)
+
+        made_links = [x for x in legislation_links if x.endswith("/made")]
+        draft_links = [x for x in legislation_links if "dsi" in x]
+        if len(made_links) == 1:
+            # if we found exactly link to a made order,
+            # assume that's what we're looking for
+            return (made_links[0], None)
+        elif len(draft_links) == 1:
+            # we'll need to look at the draft to find the made order
+            return (None, draft_links[0])
+        return (None, None)
+
+    def get_record(self, url):
+        """
+        Build a record for the review on this page
+
+        Returns a tuple of (rec, draft_link). If draft_link is not None
+        rec["eco"] should be populated by following the draft link
+        """
+        rec = {
+            "slug": url.split("/")[-1],
+            "latest_event": self.title,
+            "shapefiles": self.get_shapefiles(),
+            "eco": None,
+            "eco_made": 0,
+        }
+        draft_link = None
+
+        # try to work out if the ECO is 'made'
+        # (only bother reading the text if this looks like an ECO)
+        if is_eco(self.title):
+            text = self.get_body_text()
+            if all(made_text in text for made_text in ECO_MADE_TEXT):
+                rec["eco_made"] = 1
+                rec["eco"], draft_link = self.get_legislation()
+
+        return (rec, draft_link)
+
+
+def find_made_link(content):
+    # find the link to the made order on a draft order's page
+    rel_link = re.search(r"(wsi|uksi)\/\d+\/\d+\/(contents\/)?made", content)
+    if rel_link:
+        return "https://www.legislation.gov.uk/{}".format(rel_link.group())
+    return None
+
+
+def parse_page(url, body, encoding):
+    """
+    Parse a fetched page from its raw bytes
+
+    This only deals in plain data so it can run in a worker process.
+    Returns a tuple of (rec, draft_link, follow_links): rec is None
+    if this is not a review page and follow_links are absolute URLs.
+    """
+    parser = lxml.html.HTMLParser(encoding=encoding, recover=True)
+    root = lxml.html.document_fromstring(body, parser=parser)
+    page = DetailPage(root)
+    follow_links = [urljoin(url, link) for link in page.follow_links]
+    if page.title is None:
+        return (None, None, follow_links)
+    rec, draft_link = page.get_record(url)
+    return (rec, draft_link, follow_links)
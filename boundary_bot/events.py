@@ -0,0 +1,141 @@
+import json
+import logging
+
+import requests
+import scraperwiki
+from boundary_bot import db
+
+
+logger = logging.getLogger(__name__)
+
+
+# types of change event
+NEW_REVIEW = "new_review"
+EVENT_CHANGED = "event_changed"
+COMPLETED = "completed"
+ECO_MADE = "eco_made"
+SHAPEFILE_CHANGED = "shapefile_changed"
+
+
+def make_event(event_type, record, created_at):
+    return {
+        "type": event_type,
+        "slug": record["slug"],
+        "created_at": created_at,
+        "review": dict(record.as_dict()),
+    }
+
+
+class EventStore:
+
+    """
+    A persistent, ordered log of change events and the webhooks they
+    are published to
+
+    Each event gets an increasing id, which clients can use as a cursor
+    to replay everything after it. Each webhook has its own cursor,
+    which only moves on once the webhook has accepted an event, so
+    delivery is at-least-once: receivers should de-duplicate by id.
+    """
+
+    TABLE_NAME = "lgbce_change_events"
+    WEBHOOKS_TABLE_NAME = "lgbce_webhooks"
+    TIMEOUT = 10
+
+    def __init__(self):
+        scraperwiki.sql.execute(
+            """
+            CREATE TABLE IF NOT EXISTS %s (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                type TEXT,
+                slug TEXT,
+                created_at TEXT,
+                review TEXT
+            );"""
+            % self.TABLE_NAME
+        )
+        scraperwiki.sql.execute(
+            """
+            CREATE TABLE IF NOT EXISTS %s (
+                url TEXT PRIMARY KEY,
+                cursor INT DEFAULT 0
+            );"""
+            % self.WEBHOOKS_TABLE_NAME
+        )
+
+    def append(self, events):
+        if not events:
+            return
+        db.execute(
+            "INSERT INTO %s (type, slug, created_at, review) VALUES (?, ?, ?, ?)"
+            % (self.TABLE_NAME),
+            [
+                [
+                    event["type"],
+                    event["slug"],
+                    event["created_at"],
+                    json.dumps(event["review"], sort_keys=True),
+                ]
+                for event in events
+            ],
+        )
+
+    def get_latest_id(self):
+        result = scraperwiki.sql.select("MAX(id) AS latest FROM %s" % (self.TABLE_NAME))
+        return result[0]["latest"] or 0
+
+    def get_since(self, cursor, limit=100):
+        rows = scraperwiki.sql.select(
+            "* FROM %s WHERE id>? ORDER BY id LIMIT ?" % (self.TABLE_NAME),
+            [cursor, limit],
+        )
+        for row in rows:
+            row["review"] = json.loads(row["review"])
+        return rows
+
+    def add_webhook(self, url, cursor=None):
+        # by default, new webhooks only get events from now on
+        if cursor is None:
+            cursor = self.get_latest_id()
+        db.save(
+            unique_keys=["url"],
+            data={"url": url, "cursor": cursor},
+            table_name=self.WEBHOOKS_TABLE_NAME,
+        )
+
+    def remove_webhook(self, url):
+        db.execute("DELETE FROM %s WHERE url=?" % (self.WEBHOOKS_TABLE_NAME), [url])
+
+    def get_webhooks(self):
+        return scraperwiki.sql.select(
+            "* FROM %s ORDER BY url" % (self.WEBHOOKS_TABLE_NAME)
+        )
+
+    def deliver(self):
+        # POST every event each webhook hasn't seen yet, in order.
+        # If a webhook fails, we stop there and try again next time.
+        for webhook in self.get_webhooks():
+            cursor = webhook["cursor"]
+            try:
+                while True:
+                    events = self.get_since(cursor)
+                    if not events:
+                        break
+                    for event in events:
+                        r = requests.post(
+                            webhook["url"], json=event, timeout=self.TIMEOUT
+                        )
+                        r.raise_for_status()
+                        cursor = event["id"]
+                        db.execute(
+                            "UPDATE %s SET cursor=? WHERE url=?"
+                            % (self.WEBHOOKS_TABLE_NAME),
+                            [cursor, webhook["url"]],
+                        )
+            except requests.exceptions.RequestException as e:
+                logger.warning(
+                    "Failed to deliver events after %i to %s: %s",
+                    cursor,
+                    webhook["url"],
+                    str(e),
+                )
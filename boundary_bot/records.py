@@ -0,0 +1,98 @@
+from collections import OrderedDict
+
+
+class Review:
+
+    """
+    A boundary review, as stored in the lgbce_reviews table
+
+    Reviews use __slots__ rather than a per-record dict,
+    but support record["field"] access so they can be used
+    anywhere we used to pass a dict around.
+    """
+
+    FIELDS = (
+        "slug",
+        "name",
+        "register_code",
+        "url",
+        "status",
+        "latest_event",
+        "shapefiles",
+        "eco",
+        "eco_made",
+    )
+    __slots__ = FIELDS
+
+    def __init__(
+        self,
+        slug,
+        name=None,
+        register_code=None,
+        url=None,
+        status=None,
+        latest_event=None,
+        shapefiles=None,
+        eco=None,
+        eco_made=0,
+    ):
+        self.slug = slug
+        self.name = name
+        self.register_code = register_code
+        self.url = url
+        self.status = status
+        self.latest_event = latest_event
+        self.shapefiles = shapefiles
+        self.eco = eco
+        self.eco_made = eco_made
+
+    def __getitem__(self, key):
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __eq__(self, other):
+        if not isinstance(other, Review):
+            return NotImplemented
+        return self.as_tuple() == other.as_tuple()
+
+    # reviews are mutable, so they can't be hashed
+    __hash__ = None
+
+    def __repr__(self):
+        return "Review(%s)" % ", ".join(
+            "%s=%r" % (key, getattr(self, key)) for key in self.FIELDS
+        )
+
+    def as_tuple(self):
+        return tuple(getattr(self, key) for key in self.FIELDS)
+
+    def as_dict(self):
+        return OrderedDict((key, getattr(self, key)) for key in self.FIELDS)
+
+    def update(self, row):
+        # copy any fields we know about from a dict
+        # (e.g: a row from the DB or a record from the spider)
+        for key in self.FIELDS:
+            if key in row:
+                setattr(self, key, row[key])
+
+    def diff(self, row):
+        """
+        Compare this review with a stored row
+
+        Returns a dict of {field: (old, new)} for every field which
+        has changed. If row is None, every field has changed.
+        """
+        if row is None:
+            return OrderedDict((key, (None, getattr(self, key))) for key in self.FIELDS)
+        return OrderedDict(
+            (key, (row[key], getattr(self, key)))
+            for key in self.FIELDS
+            if row[key] != getattr(self, key)
+        )
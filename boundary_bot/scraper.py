@@ -1,21 +1,38 @@
+import datetime
+import hashlib
 import json
 import lxml.html
 import pprint
 import requests
 import scraperwiki
+import zipfile
 from collections import OrderedDict
+from boundary_bot import db
 from boundary_bot.code_matcher import CodeMatcher
+from boundary_bot import events
+from boundary_bot.search import SearchIndex
 from boundary_bot.common import (
     BASE_URL,
     START_PAGE,
     REQUEST_HEADERS,
     SLACK_WEBHOOK_URL,
     GITHUB_API_KEY,
+    PARSE_WORKERS,
+    SHARDS,
     is_eco,
 )
 from boundary_bot.github import GitHubIssueHelper, GitHubSyncHelper
+from boundary_bot.records import Review
+from boundary_bot.shapefiles import ShapefileStore
+from boundary_bot.sharding import merge_partials, run_local_shards
 from boundary_bot.slack import SlackHelper
-from boundary_bot.spider import LgbceSpider, SpiderWrapper
+from boundary_bot.spider import (
+    LgbcePoolSpider,
+    LgbceSpider,
+    PoolSpiderWrapper,
+    SpiderWrapper,
+)
+from boundary_bot.wards import WardStore, read_wards
 
 
 class ScraperException(Exception):
@@ -37,6 +54,60 @@ class LgbceScraper:
     CURRENT_LABEL = "Current Reviews"
     COMPLETED_LABEL = "Recent Reviews"
     TABLE_NAME = "lgbce_reviews"
+    CHECKS_TABLE_NAME = "lgbce_review_checks"
+    # when each review was last inserted, updated or deleted.
+    # seq increases with every change, so API clients can use it as a cursor
+    CHANGES_TABLE_NAME = "lgbce_review_changes"
+    FINGERPRINT_VAR = "index_fingerprint"
+
+    # When the index hasn't changed, how often we should
+    # still look at a review's page, depending on its stage
+    CHECK_INTERVALS = {
+        "current": datetime.timedelta(days=3),
+        "eco": datetime.timedelta(days=1),
+        "completed": datetime.timedelta(days=14),
+        "eco_made": datetime.timedelta(days=28),
+    }
+    # allow for runs starting at slightly different times each day
+    CHECK_SLACK = datetime.timedelta(hours=1)
+
+    # Consistency checks on the records we've scraped.
+    # Each rule is a WHERE clause over the scraped records (b)
+    # left joined to the stored records (r), and a message
+    # to report for each record which matches it.
+    # {scraped} is every item the spider returned, before
+    # they were combined into one record for each slug.
+    BATCH_TABLE_NAME = "lgbce_review_batch"
+    SCRAPED_TABLE_NAME = "lgbce_review_scraped"
+    VALIDATION_RULES = (
+        (
+            # we shouldn't have found a record for the first time when it is completed
+            # we should find it under review and then it should move to completed
+            "r.slug IS NULL AND b.status = :completed",
+            "New record found but status is '{completed}':\n{record}",
+        ),
+        (
+            # the review isn't brand new and we've failed to scrape the latest review event
+            "r.slug IS NOT NULL AND b.latest_event IS NULL "
+            "AND (r.latest_event IS NULL OR r.latest_event != '')",
+            "Failed to populate 'latest_event' field:\n{record}",
+        ),
+        (
+            # reviews shouldn't move backwards from completed to current
+            "b.status = :current AND r.status = :completed",
+            "Record status has changed from '{completed}' to '{current}':\n{record}",
+        ),
+        (
+            # reviews shouldn't move backwards from made to not made
+            "b.eco_made = 0 AND r.eco_made = 1",
+            "'eco_made' field has changed from 1 to 0:\n{record}",
+        ),
+        (
+            # society has collapsed :(
+            "(SELECT COUNT(*) FROM {scraped} d WHERE d.slug = b.slug) > 1",
+            "Human sacrifice, dogs and cats living together, mass hysteria!",
+        ),
+    )
 
     def __init__(self, BOOTSTRAP_MODE, SEND_NOTIFICATIONS):
         scraperwiki.sql.execute(
@@ -54,20 +125,85 @@ class LgbceScraper:
             );"""
             % self.TABLE_NAME
         )
+        scraperwiki.sql.execute(
+            """
+            CREATE TABLE IF NOT EXISTS %s (
+                slug TEXT PRIMARY KEY,
+                checked_at TEXT
+            );"""
+            % self.CHECKS_TABLE_NAME
+        )
+        scraperwiki.sql.execute(
+            """
+            CREATE TABLE IF NOT EXISTS %s (
+                slug TEXT PRIMARY KEY,
+                changed_at TEXT,
+                deleted INT DEFAULT 0,
+                seq INTEGER
+            );"""
+            % self.CHANGES_TABLE_NAME
+        )
+        # for the read API's queries
+        for table, column in [
+            (self.TABLE_NAME, "status"),
+            (self.TABLE_NAME, "register_code"),
+            (self.TABLE_NAME, "eco_made"),
+            (self.CHANGES_TABLE_NAME, "seq"),
+        ]:
+            scraperwiki.sql.execute(
+                "CREATE INDEX IF NOT EXISTS %s_%s ON %s (%s);"
+                % (table, column, table, column)
+            )
         self.data = {}
-        self.code_matcher = CodeMatcher()
+        # the slug of every item the spider returned, including any duplicates
+        self.scraped = []
+        self.stored = set()
+        # paths of partial results from a sharded crawl
+        # to use instead of crawling the review pages ourselves
+        self.partials = None
+        # Scrapy settings for the spider (e.g: HTTP_CACHE_SETTINGS)
+        self.spider_settings = None
+        # in a dry run, we print what we would have changed
+        # instead of saving anything or sending notifications
+        self.dry_run = False
+        self._code_matcher = None
+        self.event_store = events.EventStore()
+        self.events = []
+        self.search_index = SearchIndex()
         self.slack_helper = SlackHelper()
         self.github_helper = GitHubIssueHelper()
+        self.shapefile_store = ShapefileStore()
+        self.shapefile_data = {}
+        self.ward_store = WardStore()
+        self.ward_data = {}
         self.BOOTSTRAP_MODE = BOOTSTRAP_MODE
         self.SEND_NOTIFICATIONS = SEND_NOTIFICATIONS
 
-    def scrape_index(self):
+    @property
+    def code_matcher(self):
+        # only fetch the register data if we actually need it
+        if self._code_matcher is None:
+            self._code_matcher = CodeMatcher()
+        return self._code_matcher
+
+    def get_now(self):
+        return datetime.datetime.now().replace(microsecond=0)
+
+    @staticmethod
+    def scrape_index():
         headers = REQUEST_HEADERS
         r = requests.get(START_PAGE, headers=headers)
         return r.text
 
-    def parse_index(self, html):
-        expected_headings = [self.CURRENT_LABEL, self.COMPLETED_LABEL]
+    @classmethod
+    def read_index(cls, html):
+        """
+        Parse the current reviews page into a Review for each review
+
+        This doesn't touch the DB, so it can be used without
+        creating an LgbceScraper (e.g: by a shard worker)
+        """
+        expected_headings = [cls.CURRENT_LABEL, cls.COMPLETED_LABEL]
         root = lxml.html.fromstring(html)
 
         headings = root.cssselect("div.field--label")
@@ -79,6 +215,7 @@ class LgbceScraper:
                 % (str(found_headings), str(expected_headings))
             )
 
+        index = OrderedDict()
         for heading in headings:
             text = str(heading.text)
             ul = heading.getnext().find(".//ul")
@@ -89,110 +226,232 @@ class LgbceScraper:
                 if not url.startswith("http"):
                     url = BASE_URL + url
                 slug = url.split("/")[-1]
-                self.data[slug] = {
-                    "slug": slug,
-                    "name": link.text.strip(),
-                    "register_code": None,
-                    "url": url,
-                    "status": text,
-                    "latest_event": None,
-                    "shapefiles": None,
-                    "eco": None,
-                    "eco_made": 0,
-                }
+                index[slug] = Review(
+                    slug=slug, name=link.text.strip(), url=url, status=text
+                )
+        return index
+
+    def parse_index(self, html):
+        self.data.update(self.read_index(html))
+
+    def get_index_fingerprint(self):
+        # everything we got from the index page,
+        # in a form we can cheaply compare with the last run
+        index = sorted(
+            (rec["slug"], rec["name"], rec["url"], rec["status"])
+            for rec in self.data.values()
+        )
+        return hashlib.sha256(json.dumps(index).encode("utf-8")).hexdigest()
+
+    def is_index_unchanged(self, fingerprint):
+        if self.BOOTSTRAP_MODE or self.dry_run:
+            # always look at every review in a dry run:
+            # we're probably testing a change to the parser
+            return False
+        return fingerprint == scraperwiki.sql.get_var(self.FINGERPRINT_VAR)
+
+    def get_stage(self, row):
+        if row["eco_made"]:
+            return "eco_made"
+        if is_eco(row["latest_event"] or ""):
+            return "eco"
+        if row["status"] == self.COMPLETED_LABEL:
+            return "completed"
+        return "current"
+
+    def get_due_reviews(self):
+        # which reviews should we look at, even though the index is unchanged?
+        rows = {
+            row["slug"]: row
+            for row in scraperwiki.sql.select("* FROM %s" % (self.TABLE_NAME))
+        }
+        checks = {
+            row["slug"]: datetime.datetime.strptime(
+                row["checked_at"], "%Y-%m-%dT%H:%M:%S"
+            )
+            for row in scraperwiki.sql.select("* FROM %s" % (self.CHECKS_TABLE_NAME))
+        }
+        now = self.get_now()
+
+        due = []
+        for slug in sorted(self.data):
+            if slug not in rows or slug not in checks:
+                due.append(slug)
+                continue
+            interval = self.CHECK_INTERVALS[self.get_stage(rows[slug])]
+            if now - checks[slug] >= interval - self.CHECK_SLACK:
+                due.append(slug)
+        return due
+
+    def attach_stored_data(self, slugs):
+        # fill in reviews we're not going to crawl from the DB
+        for slug in slugs:
+            result = scraperwiki.sql.select(
+                "* FROM %s WHERE slug=?" % (self.TABLE_NAME), slug
+            )
+            self.data[slug].update(result[0])
+            self.stored.add(slug)
+
+    def get_review_details(self, start_urls=None):
+        if self.partials is not None:
+            return merge_partials(
+                self.partials, [record["url"] for record in self.data.values()]
+            )
+        if SHARDS > 1:
+            if start_urls is None:
+                start_urls = [record["url"] for record in self.data.values()]
+            return run_local_shards(
+                start_urls, SHARDS, self.spider_settings, PARSE_WORKERS
+            )
 
-    def attach_spider_data(self):
-        wrapper = SpiderWrapper(LgbceSpider)
-        review_details = wrapper.run_spider()
+        spider_kwargs = {}
+        if start_urls is not None:
+            # just crawl these pages
+            spider_kwargs = {"start_urls": start_urls, "follow": False}
+        if PARSE_WORKERS:
+            wrapper = PoolSpiderWrapper(
+                LgbcePoolSpider, PARSE_WORKERS, self.spider_settings, **spider_kwargs
+            )
+        else:
+            wrapper = SpiderWrapper(LgbceSpider, self.spider_settings, **spider_kwargs)
+        return wrapper.run_spider()
+
+    def attach_spider_data(self, start_urls=None):
+        review_details = self.get_review_details(start_urls)
         for area in review_details:
             if area["slug"] not in self.data:
                 raise ScraperException(
                     "Unexpected slug: Found '%s', expected %s"
                     % (area["slug"], str([rec for rec in self.data]))
                 )
-            self.data[area["slug"]]["latest_event"] = area["latest_event"]
-            self.data[area["slug"]]["shapefiles"] = area["shapefiles"]
-            self.data[area["slug"]]["eco"] = area["eco"]
-            self.data[area["slug"]]["eco_made"] = area["eco_made"]
+            self.scraped.append(area["slug"])
+            self.data[area["slug"]].update(area)
+
+    def attach_shapefiles(self):
+        # download any shapefile zips which are new or have changed
+        for key, record in self.data.items():
+            if not record["shapefiles"] or key in self.stored:
+                continue
+            try:
+                self.shapefile_data[key] = self.shapefile_store.fetch(
+                    record["shapefiles"]
+                )
+            except requests.exceptions.RequestException as e:
+                # don't let a broken download hold up everything else
+                print("Failed to fetch %s: %s" % (record["shapefiles"], str(e)))
+
+    def attach_wards(self):
+        # summarise the wards in any shapefiles we haven't seen before
+        for key, (row, status) in self.shapefile_data.items():
+            summary = self.ward_store.get_summary(key)
+            if summary and summary["sha256"] == row["sha256"]:
+                continue
+            path = self.shapefile_store.get_path(row["sha256"])
+            try:
+                self.ward_data[key] = (row["sha256"], read_wards(path))
+            except (OSError, zipfile.BadZipFile, ValueError) as e:
+                print("Failed to read wards from %s: %s" % (row["url"], str(e)))
 
     def attach_register_codes(self):
         for key, record in self.data.items():
+            if key in self.stored:
+                continue
             code, *_ = self.code_matcher.get_register_code(record["name"])
             record["register_code"] = code
 
     def validate(self):
         # perform some consistency checks
         # and raise an error if unexpected things have happened
-        for key, record in self.data.items():
-
-            if self.BOOTSTRAP_MODE:
-                # skip all the checks if we are initializing an empty DB
-                return True
-
-            result = scraperwiki.sql.select(
-                "* FROM %s WHERE slug=?" % (self.TABLE_NAME), record["slug"]
-            )
-
-            if len(result) == 0 and record["status"] == self.COMPLETED_LABEL:
-                # we shouldn't have found a record for the first time when it is completed
-                # we should find it under review and then it should move to completed
-                raise ScraperException(
-                    "New record found but status is '%s':\n%s"
-                    % (self.COMPLETED_LABEL, str(record))
-                )
-
-            if (
-                len(result) == 1
-                and record["latest_event"] is None
-                and result[0]["latest_event"] != ""
-            ):
-                # the review isn't brand new and we've failed to scrape the latest review event
-                raise ScraperException(
-                    "Failed to populate 'latest_event' field:\n%s" % (str(record))
-                )
+        if self.BOOTSTRAP_MODE:
+            # skip all the checks if we are initializing an empty DB
+            return True
 
-            if (
-                len(result) == 1
-                and record["status"] == self.CURRENT_LABEL
-                and result[0]["status"] == self.COMPLETED_LABEL
-            ):
-                # reviews shouldn't move backwards from completed to current
-                raise ScraperException(
-                    "Record status has changed from '%s' to '%s':\n%s"
-                    % (self.COMPLETED_LABEL, self.CURRENT_LABEL, str(record))
+        violations = self.find_violations()
+        if violations:
+            raise ScraperException(
+                "\n\n".join(
+                    self.VALIDATION_RULES[rule][1].format(
+                        completed=self.COMPLETED_LABEL,
+                        current=self.CURRENT_LABEL,
+                        record=str(self.data[slug]),
+                    )
+                    for slug, rule in violations
                 )
+            )
+        return True
 
-            if (
-                len(result) == 1
-                and record["eco_made"] == 0
-                and result[0]["eco_made"] == 1
-            ):
-                # reviews shouldn't move backwards from made to not made
-                raise ScraperException(
-                    "'eco_made' field has changed from 1 to 0:\n%s" % (str(record))
-                )
+    def stage_batch(self):
+        # copy the records we've scraped into a temp table
+        # so we can compare them with the stored records in SQL
+        self.drop_batch()
+        db.execute(
+            "CREATE TEMP TABLE %s AS SELECT %s FROM %s WHERE 0"
+            % (self.BATCH_TABLE_NAME, ", ".join(Review.FIELDS), self.TABLE_NAME)
+        )
+        if self.data:
+            db.execute(
+                "INSERT INTO %s (%s) VALUES (%s)"
+                % (
+                    self.BATCH_TABLE_NAME,
+                    ", ".join(Review.FIELDS),
+                    ", ".join("?" for field in Review.FIELDS),
+                ),
+                [list(record.as_tuple()) for record in self.data.values()],
+            )
+        db.execute("CREATE TEMP TABLE %s (slug TEXT)" % (self.SCRAPED_TABLE_NAME))
+        if self.scraped:
+            db.execute(
+                "INSERT INTO %s (slug) VALUES (?)" % (self.SCRAPED_TABLE_NAME),
+                [[slug] for slug in self.scraped],
+            )
 
-            if len(result) > 1:
-                # society has collapsed :(
-                raise ScraperException(
-                    "Human sacrifice, dogs and cats living together, mass hysteria!"
-                )
-        return True
+    def drop_batch(self):
+        for table_name in [self.BATCH_TABLE_NAME, self.SCRAPED_TABLE_NAME]:
+            db.execute("DROP TABLE IF EXISTS temp.%s" % (table_name))
+
+    def find_violations(self):
+        """
+        Check the scraped records against every rule in VALIDATION_RULES
+
+        All the rules are evaluated in a single query.
+        Returns a list of (slug, rule) tuples in the order the
+        records were scraped, where rule indexes VALIDATION_RULES
+        """
+        self.stage_batch()
+        queries = [
+            "SELECT DISTINCT b.rowid AS pos, %i AS rule, b.slug AS slug "
+            "FROM %s b LEFT JOIN %s r ON r.slug = b.slug WHERE %s"
+            % (
+                i,
+                self.BATCH_TABLE_NAME,
+                self.TABLE_NAME,
+                condition.format(scraped=self.SCRAPED_TABLE_NAME),
+            )
+            for i, (condition, message) in enumerate(self.VALIDATION_RULES)
+        ]
+        result = scraperwiki.sql.select(
+            " slug, rule FROM (%s) ORDER BY pos, rule" % (" UNION ALL ".join(queries)),
+            {"completed": self.COMPLETED_LABEL, "current": self.CURRENT_LABEL},
+        )
+        self.drop_batch()
+        return [(row["slug"], row["rule"]) for row in result]
 
     def pre_process(self):
         for key, record in self.data.items():
             if record["latest_event"] is None:
                 record["latest_event"] = ""
 
-    def make_notifications(self):
+    def make_events(self):
+        created_at = self.get_now().isoformat()
         for key, record in self.data.items():
+            found = []
             result = scraperwiki.sql.select(
                 "* FROM %s WHERE slug=?" % (self.TABLE_NAME), record["slug"]
             )
 
             if len(result) == 0:
                 # we've not seen this boundary review before
-                self.slack_helper.append_new_review_message(record)
+                found.append(events.NEW_REVIEW)
 
             if len(result) == 1:
                 # we've already got our eye on this one
@@ -200,16 +459,129 @@ class LgbceScraper:
                     record["status"] == self.COMPLETED_LABEL
                     and result[0]["status"] != self.COMPLETED_LABEL
                 ):
-                    self.slack_helper.append_completed_review_message(record)
-                    self.github_helper.append_completed_review_issue(record)
+                    found.append(events.COMPLETED)
                 if result[0]["latest_event"] != record["latest_event"]:
-                    self.slack_helper.append_event_message(record)
+                    found.append(events.EVENT_CHANGED)
+                if record["eco_made"] == 1 and result[0]["eco_made"] != 1:
+                    found.append(events.ECO_MADE)
+
+            if key in self.shapefile_data:
+                row, status = self.shapefile_data[key]
+                if status == self.shapefile_store.CHANGED:
+                    # same URL, different file
+                    found.append(events.SHAPEFILE_CHANGED)
+
+            self.events += [
+                events.make_event(event_type, record, created_at)
+                for event_type in found
+            ]
+
+    def make_notifications(self):
+        self.events = []
+        self.make_events()
+        # Slack and GitHub just get a message about some types of event
+        for event in self.events:
+            record = event["review"]
+            if event["type"] == events.NEW_REVIEW:
+                self.slack_helper.append_new_review_message(record)
+            if event["type"] == events.COMPLETED:
+                self.slack_helper.append_completed_review_message(record)
+                self.github_helper.append_completed_review_issue(record)
+            if event["type"] == events.EVENT_CHANGED:
+                self.slack_helper.append_event_message(record)
+            if event["type"] == events.SHAPEFILE_CHANGED:
+                self.slack_helper.append_shapefile_changed_message(record)
+
+    def save_changes(self, slugs, deleted=0):
+        # Every change gets the next seq. These are written in one
+        # transaction, so a client never sees a later seq before an earlier one.
+        changed_at = self.get_now().isoformat()
+        seq = scraperwiki.sql.select(
+            "IFNULL(MAX(seq), 0) AS seq FROM %s" % (self.CHANGES_TABLE_NAME)
+        )[0]["seq"]
+        db.save(
+            unique_keys=["slug"],
+            data=[
+                {
+                    "slug": slug,
+                    "changed_at": changed_at,
+                    "deleted": deleted,
+                    "seq": seq + i,
+                }
+                for i, slug in enumerate(sorted(slugs), 1)
+            ],
+            table_name=self.CHANGES_TABLE_NAME,
+        )
 
     def save(self):
-        for key, record in self.data.items():
-            scraperwiki.sqlite.save(
-                unique_keys=["slug"], data=record, table_name=self.TABLE_NAME
+        # only write the reviews which have changed
+        stored = {
+            row["slug"]: row
+            for row in scraperwiki.sql.select("* FROM %s" % (self.TABLE_NAME))
+        }
+        changed = [
+            record
+            for record in self.data.values()
+            if record.diff(stored.get(record.slug))
+        ]
+        if not self.BOOTSTRAP_MODE:
+            # when we're initializing an empty DB, every review looks new:
+            # don't publish an event for each of them.
+            # Events are appended before the reviews are written: if a later
+            # write fails, the next run sees the same changes and records
+            # them again, so they can't be lost
+            cursor = self.event_store.get_latest_id()
+            self.event_store.append(self.events)
+        db.save(
+            unique_keys=["slug"],
+            data=[record.as_dict() for record in changed],
+            table_name=self.TABLE_NAME,
+        )
+        self.save_changes([record.slug for record in changed])
+        self.search_index.index_reviews(changed)
+        if not self.BOOTSTRAP_MODE:
+            self.search_index.index_events(
+                self.event_store.get_since(cursor, limit=len(self.events))
             )
+        for key, (row, status) in self.shapefile_data.items():
+            self.shapefile_store.save(row)
+        for key, (sha256, wards) in self.ward_data.items():
+            self.ward_store.save(key, sha256, wards)
+        checked_at = self.get_now().isoformat()
+        db.save(
+            unique_keys=["slug"],
+            data=[
+                {"slug": key, "checked_at": checked_at}
+                for key in self.data
+                if key not in self.stored
+            ],
+            table_name=self.CHECKS_TABLE_NAME,
+        )
+
+    def get_changeset(self):
+        # what save() and cleanup() would do to the DB
+        stored = {
+            row["slug"]: row
+            for row in scraperwiki.sql.select("* FROM %s" % (self.TABLE_NAME))
+        }
+        changeset = {"inserted": [], "updated": [], "deleted": []}
+        for slug, record in sorted(self.data.items()):
+            if slug not in stored:
+                changeset["inserted"].append(record.as_dict())
+                continue
+            changes = record.diff(stored[slug])
+            if changes:
+                changeset["updated"].append({"slug": slug, "changes": changes})
+        if self.data:
+            changeset["deleted"] = sorted(set(stored) - set(self.data))
+        return changeset
+
+    def print_changeset(self):
+        changeset = self.get_changeset()
+        changeset["slack_messages"] = self.slack_helper.messages
+        changeset["github_issues"] = self.github_helper.issues
+        changeset["events"] = self.events
+        print(json.dumps(changeset, sort_keys=True, indent=4))
 
     def send_notifications(self):
 
@@ -230,16 +602,28 @@ class LgbceScraper:
             self.slack_helper.post_messages()
         if GITHUB_API_KEY:
             self.github_helper.raise_issues()
+        self.deliver_events()
+
+    def deliver_events(self):
+        # this includes any events we failed to deliver last time
+        if self.SEND_NOTIFICATIONS:
+            self.event_store.deliver()
 
     def cleanup(self):
         # remove any stale records from the DB
         if not self.data:
             return
         placeholders = "(" + ", ".join(["?" for rec in self.data]) + ")"
-        result = scraperwiki.sql.execute(
+        stale = scraperwiki.sql.select(
+            ("slug FROM %s WHERE slug NOT IN " + placeholders) % (self.TABLE_NAME),
+            [slug for slug in self.data],
+        )
+        result = db.execute(
             ("DELETE FROM %s WHERE slug NOT IN " + placeholders) % (self.TABLE_NAME),
             [slug for slug in self.data],
         )
+        self.save_changes([row["slug"] for row in stale], deleted=1)
+        self.search_index.remove_reviews([row["slug"] for row in stale])
 
     def dump_table_to_json(self):
         records = scraperwiki.sqlite.select(
@@ -259,12 +643,35 @@ class LgbceScraper:
 
     def scrape(self):
         self.parse_index(self.scrape_index())
-        self.attach_spider_data()
+
+        fingerprint = self.get_index_fingerprint()
+        # partials from a sharded crawl cover the whole index
+        # so don't take the fast path if we've got them
+        if self.partials is None and self.is_index_unchanged(fingerprint):
+            due = self.get_due_reviews()
+            if not due:
+                print("Index unchanged and no reviews are due for a check")
+                # there's nothing new, but we might have events to retry
+                self.deliver_events()
+                return
+            self.attach_stored_data([slug for slug in self.data if slug not in due])
+            self.attach_spider_data([self.data[slug]["url"] for slug in due])
+        else:
+            self.attach_spider_data()
+
+        if not self.dry_run:
+            # this writes the zips to the shapefile store
+            self.attach_shapefiles()
+            self.attach_wards()
         self.attach_register_codes()
         self.validate()
         self.pre_process()
         self.make_notifications()
+        if self.dry_run:
+            self.print_changeset()
+            return
         self.save()
         self.send_notifications()
         self.cleanup()
         self.sync_db_to_github()
+        scraperwiki.sql.save_var(self.FINGERPRINT_VAR, fingerprint)
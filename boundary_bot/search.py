@@ -0,0 +1,309 @@
+import re
+
+import scraperwiki
+from rapidfuzz import process
+from boundary_bot import db
+from boundary_bot.code_matcher import CodeMatcher
+
+
+def table_exists(table_name):
+    result = scraperwiki.sql.select(
+        "name FROM sqlite_master WHERE type='table' AND name=?", [table_name]
+    )
+    return len(result) > 0
+
+
+def make_match_query(text):
+    # Quote every word so punctuation in the search can't be read as
+    # FTS syntax, and match the last word as a prefix (e.g: 'basing')
+    words = re.findall(r"\w+", text.lower())
+    if not words:
+        return None
+    return " ".join('"%s"' % word for word in words) + "*"
+
+
+class SearchIndex:
+
+    """
+    Full-text index over review names, latest events and event history
+
+    The index is an SQLite FTS5 table with one document for each
+    review, archive record and change event. Each document is keyed by
+    its source (e.g: review:<slug>) so it can be replaced when the
+    source changes: the keys table maps each key to its rowid in the
+    index, as FTS can only look documents up by rowid. The scraper and the archive crawl keep it up to date
+    as they save. It is built from scratch the first time it is created.
+
+    If nothing matches the text, we fall back to a fuzzy match on
+    review names and on council names from the CodeMatcher, so typos
+    still find something.
+    """
+
+    TABLE_NAME = "lgbce_search"
+    KEYS_TABLE_NAME = "lgbce_search_keys"
+    REVIEWS_TABLE_NAME = "lgbce_reviews"
+    ARCHIVE_TABLE_NAME = "lgbce_archive"
+    EVENTS_TABLE_NAME = "lgbce_change_events"
+    # fuzzy matches scoring less than this (out of 100) are ignored
+    FUZZY_CUTOFF = 85
+
+    def __init__(self, use_council_names=True):
+        exists = table_exists(self.TABLE_NAME) and table_exists(self.KEYS_TABLE_NAME)
+        scraperwiki.sql.execute(
+            """
+            CREATE VIRTUAL TABLE IF NOT EXISTS %s USING fts5(
+                key UNINDEXED,
+                slug UNINDEXED,
+                source UNINDEXED,
+                name,
+                body,
+                tokenize='porter unicode61'
+            );"""
+            % self.TABLE_NAME
+        )
+        scraperwiki.sql.execute(
+            """
+            CREATE TABLE IF NOT EXISTS %s (
+                key TEXT PRIMARY KEY,
+                docid INTEGER
+            );"""
+            % self.KEYS_TABLE_NAME
+        )
+        scraperwiki.sql.commit_transactions()
+        self.use_council_names = use_council_names
+        self._code_matcher = None
+        if not exists:
+            self.rebuild()
+
+    @property
+    def code_matcher(self):
+        # only fetch the register data if we actually need it
+        if self._code_matcher is None:
+            self._code_matcher = CodeMatcher()
+        return self._code_matcher
+
+    def insert(self, docs):
+        # docs are (key, slug, source, name, body) tuples
+        if not docs:
+            return
+        # give the documents rowids ourselves, so we can record them
+        last = scraperwiki.sql.select(
+            "rowid FROM %s ORDER BY rowid DESC LIMIT 1" % (self.TABLE_NAME)
+        )
+        first = last[0]["rowid"] + 1 if last else 1
+        db.execute(
+            "INSERT INTO %s (rowid, key, slug, source, name, body) "
+            "VALUES (?, ?, ?, ?, ?, ?)" % (self.TABLE_NAME),
+            [[first + i] + list(doc) for i, doc in enumerate(docs)],
+        )
+        db.execute(
+            "INSERT OR REPLACE INTO %s (key, docid) VALUES (?, ?)"
+            % (self.KEYS_TABLE_NAME),
+            [[doc[0], first + i] for i, doc in enumerate(docs)],
+        )
+
+    def delete(self, keys):
+        if not keys:
+            return
+        rows = scraperwiki.sql.select(
+            "docid FROM %s WHERE key IN (%s)"
+            % (self.KEYS_TABLE_NAME, ", ".join(["?" for key in keys])),
+            list(keys),
+        )
+        if rows:
+            db.execute(
+                "DELETE FROM %s WHERE rowid=?" % (self.TABLE_NAME),
+                [[row["docid"]] for row in rows],
+            )
+        db.execute(
+            "DELETE FROM %s WHERE key IN (%s)"
+            % (self.KEYS_TABLE_NAME, ", ".join(["?" for key in keys])),
+            list(keys),
+        )
+
+    def replace(self, docs):
+        self.delete([doc[0] for doc in docs])
+        self.insert(docs)
+
+    def index_reviews(self, records):
+        self.replace(
+            [
+                (
+                    "review:%s" % record["slug"],
+                    record["slug"],
+                    "review",
+                    record["name"],
+                    record["latest_event"],
+                )
+                for record in records
+            ]
+        )
+
+    def remove_reviews(self, slugs):
+        self.delete(["review:%s" % slug for slug in slugs])
+
+    def index_archive(self, records):
+        self.replace(
+            [
+                (
+                    "archive:%s" % record["url"],
+                    record["slug"],
+                    "archive",
+                    record["name"],
+                    record["latest_event"],
+                )
+                for record in records
+            ]
+        )
+
+    def index_events(self, events):
+        # events never change, so we only ever add them
+        self.insert(
+            [
+                (
+                    "event:%i" % event["id"],
+                    event["slug"],
+                    "event",
+                    event["review"].get("name"),
+                    event["review"].get("latest_event"),
+                )
+                for event in events
+            ]
+        )
+
+    def rebuild(self):
+        db.execute("DELETE FROM %s" % (self.TABLE_NAME))
+        db.execute("DELETE FROM %s" % (self.KEYS_TABLE_NAME))
+        sources = [
+            (
+                self.REVIEWS_TABLE_NAME,
+                "'review:' || slug, slug, 'review', name, latest_event",
+            ),
+            (
+                self.ARCHIVE_TABLE_NAME,
+                "'archive:' || url, slug, 'archive', name, latest_event",
+            ),
+            (
+                self.EVENTS_TABLE_NAME,
+                "'event:' || id, slug, 'event', "
+                "json_extract(review, '$.name'), "
+                "json_extract(review, '$.latest_event')",
+            ),
+        ]
+        for table_name, columns in sources:
+            if table_exists(table_name):
+                db.execute(
+                    "INSERT INTO %s (key, slug, source, name, body) SELECT %s FROM %s"
+                    % (self.TABLE_NAME, columns, table_name)
+                )
+        db.execute(
+            "INSERT INTO %s (key, docid) SELECT key, rowid FROM %s"
+            % (self.KEYS_TABLE_NAME, self.TABLE_NAME)
+        )
+        # merge the index into as few b-trees as possible for faster queries
+        db.execute(
+            "INSERT INTO %s (%s) VALUES ('optimize')"
+            % (self.TABLE_NAME, self.TABLE_NAME)
+        )
+
+    def search_text(self, text, limit=20):
+        match = make_match_query(text)
+        if match is None:
+            return []
+        # The best match for each slug (a slug can have a review, archive
+        # records and lots of events). snippet() can't be used in an
+        # aggregate query, so we get those in a second query.
+        best = scraperwiki.sql.select(
+            """rowid, MIN(score) AS score FROM (
+                SELECT rowid, slug, rank AS score FROM %s WHERE %s MATCH ?
+            ) GROUP BY slug ORDER BY score LIMIT ?"""
+            % (self.TABLE_NAME, self.TABLE_NAME),
+            [match, limit],
+        )
+        if not best:
+            return []
+        rows = scraperwiki.sql.select(
+            """rowid, slug, name, source,
+                snippet(%s, -1, '[', ']', '...', 12) AS snippet
+            FROM %s WHERE %s MATCH ? AND rowid IN (%s)"""
+            % (
+                self.TABLE_NAME,
+                self.TABLE_NAME,
+                self.TABLE_NAME,
+                ", ".join([str(row["rowid"]) for row in best]),
+            ),
+            [match],
+        )
+        rows = {row.pop("rowid"): row for row in rows}
+        results = []
+        for hit in best:
+            row = rows[hit["rowid"]]
+            results.append(
+                {
+                    "slug": row["slug"],
+                    "name": row["name"],
+                    "source": row["source"],
+                    "snippet": row["snippet"],
+                    "score": hit["score"],
+                }
+            )
+        return results
+
+    def search_names(self, text, limit=20):
+        # typo-tolerant match on review names and council names
+        names = {}
+        for row in scraperwiki.sql.select(
+            "DISTINCT slug, name FROM %s WHERE source != 'event'" % (self.TABLE_NAME)
+        ):
+            names.setdefault(row["name"], set()).add(row["slug"])
+
+        matches = [
+            (score, name, slug, "name")
+            for name, score in process.extract(
+                text, list(names), limit=len(names), score_cutoff=self.FUZZY_CUTOFF
+            )
+            for slug in names[name]
+        ]
+        if self.use_council_names and table_exists(self.REVIEWS_TABLE_NAME):
+            matches += self.search_council_names(text)
+
+        results = []
+        seen = set()
+        for score, name, slug, source in sorted(
+            matches, key=lambda match: (-match[0], match[2])
+        ):
+            if slug in seen:
+                continue
+            seen.add(slug)
+            results.append(
+                {
+                    "slug": slug,
+                    "name": name,
+                    "source": source,
+                    "snippet": None,
+                    "score": score,
+                }
+            )
+        return results[:limit]
+
+    def search_council_names(self, text):
+        # reviews for any council whose official name matches
+        matches = self.code_matcher.get_matches(text, score_cutoff=self.FUZZY_CUTOFF)
+        if not matches:
+            return []
+        scores = {code: score for code, match, score in matches}
+        rows = scraperwiki.sql.select(
+            "slug, name, register_code FROM %s WHERE register_code IN (%s)"
+            % (self.REVIEWS_TABLE_NAME, ", ".join(["?" for code in scores])),
+            list(scores),
+        )
+        return [
+            (scores[row["register_code"]], row["name"], row["slug"], "council")
+            for row in rows
+        ]
+
+    def search(self, text, limit=20):
+        results = self.search_text(text, limit)
+        if results:
+            return results
+        return self.search_names(text, limit)
@@ -0,0 +1,127 @@
+import hashlib
+import os
+import tempfile
+from urllib.parse import urljoin
+
+import scraperwiki
+from boundary_bot import db, throttle
+from boundary_bot.common import BASE_URL, REQUEST_HEADERS, SHAPEFILE_DIR
+
+
+class ShapefileStore:
+
+    """
+    Content-addressed local store for the shapefile zips linked from reviews
+
+    Zips are streamed to disk in fixed-size chunks so memory use stays
+    bounded however big the file is. Each zip is stored under its SHA-256
+    and we record the size, checksum and HTTP validators against the URL
+    so that later runs can make conditional requests and only download
+    a zip again if it has actually changed.
+    """
+
+    TABLE_NAME = "lgbce_shapefiles"
+    CHUNK_SIZE = 64 * 1024
+    TIMEOUT = 60
+
+    NEW = "new"
+    UNCHANGED = "unchanged"
+    CHANGED = "changed"
+
+    def __init__(self, root=SHAPEFILE_DIR):
+        scraperwiki.sql.execute(
+            """
+            CREATE TABLE IF NOT EXISTS %s (
+                url TEXT PRIMARY KEY,
+                sha256 TEXT,
+                size INT,
+                etag TEXT,
+                last_modified TEXT
+            );"""
+            % self.TABLE_NAME
+        )
+        self.root = root
+
+    def get_path(self, sha256):
+        return os.path.join(self.root, sha256[:2], sha256 + ".zip")
+
+    def get_previous(self, url):
+        result = scraperwiki.sql.select(
+            "* FROM %s WHERE url=?" % (self.TABLE_NAME), url
+        )
+        if len(result) == 1:
+            return result[0]
+        return None
+
+    def get_headers(self, previous):
+        headers = dict(REQUEST_HEADERS)
+        if previous is None or not os.path.exists(self.get_path(previous["sha256"])):
+            # we've never seen this file, or we've lost our local copy
+            return headers
+        if previous["etag"]:
+            headers["If-None-Match"] = previous["etag"]
+        if previous["last_modified"]:
+            headers["If-Modified-Since"] = previous["last_modified"]
+        return headers
+
+    def write(self, response):
+        # stream the body to a temp file, hashing as we go
+        # then move it into place under its checksum
+        os.makedirs(self.root, exist_ok=True)
+        sha256 = hashlib.sha256()
+        size = 0
+        tmp = tempfile.NamedTemporaryFile(dir=self.root, delete=False)
+        try:
+            with tmp:
+                for chunk in response.iter_content(chunk_size=self.CHUNK_SIZE):
+                    sha256.update(chunk)
+                    size += len(chunk)
+                    tmp.write(chunk)
+            digest = sha256.hexdigest()
+            path = self.get_path(digest)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp.name, path)
+        except Exception:
+            os.remove(tmp.name)
+            raise
+        return (digest, size)
+
+    def fetch(self, url):
+        """
+        Download the zip at url (unless it hasn't changed)
+
+        Returns a tuple of (row, status) where row is the record to save
+        and status is one of NEW, UNCHANGED or CHANGED
+        """
+        url = urljoin(BASE_URL, url)
+        previous = self.get_previous(url)
+        r = throttle.get(
+            url,
+            headers=self.get_headers(previous),
+            stream=True,
+            timeout=self.TIMEOUT,
+        )
+        try:
+            if r.status_code == 304:
+                return (previous, self.UNCHANGED)
+            r.raise_for_status()
+            sha256, size = self.write(r)
+        finally:
+            r.close()
+
+        row = {
+            "url": url,
+            "sha256": sha256,
+            "size": size,
+            "etag": r.headers.get("ETag"),
+            "last_modified": r.headers.get("Last-Modified"),
+        }
+
+        if previous is None:
+            return (row, self.NEW)
+        if previous["sha256"] == sha256:
+            return (row, self.UNCHANGED)
+        return (row, self.CHANGED)
+
+    def save(self, row):
+        db.save(unique_keys=["url"], data=row, table_name=self.TABLE_NAME)
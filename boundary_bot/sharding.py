@@ -0,0 +1,298 @@
+"""
+Split the crawl of review pages across several worker processes
+(or machines) by a hash of the review's slug.
+
+Each worker crawls the pages in its shard and writes a partial result
+file. merge_partials() checks the partials are complete and consistent
+and combines them, so the scraper can validate, save and send
+notifications once for the whole crawl.
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from boundary_bot import throttle
+from boundary_bot.common import PARSE_WORKERS
+from boundary_bot.spider import (
+    LgbcePoolSpider,
+    LgbceSpider,
+    PoolSpiderWrapper,
+    SpiderWrapper,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+# the directory containing the boundary_bot package,
+# so workers can run it as a module
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class ShardException(Exception):
+    pass
+
+
+def get_slug(url):
+    return url.split("/")[-1]
+
+
+def shard_for(slug, shards):
+    # hash() is randomised per process, so use a stable hash
+    digest = hashlib.sha1(slug.encode("utf-8")).hexdigest()
+    return int(digest, 16) % shards
+
+
+def get_shard_urls(urls, shard, shards):
+    return [url for url in urls if shard_for(get_slug(url), shards) == shard]
+
+
+def get_index_urls():
+    # fetch the current reviews page to find out what to crawl
+    # (without creating an LgbceScraper, which would set up its tables)
+    from boundary_bot.scraper import LgbceScraper
+
+    index = LgbceScraper.read_index(LgbceScraper.scrape_index())
+    return [record["url"] for record in index.values()]
+
+
+def crawl_shard(
+    shard, shards, output, urls=None, settings=None, parse_workers=PARSE_WORKERS
+):
+    """
+    Crawl the review pages in one shard and write a partial result file
+
+    If urls is None, every review on the current reviews page is
+    considered, so workers on different machines can run independently.
+    settings are Scrapy settings for the spider (e.g: HTTP_CACHE_SETTINGS).
+    """
+    if not 0 <= shard < shards:
+        raise ShardException("Shard must be between 0 and %i" % (shards - 1))
+    if urls is None:
+        urls = get_index_urls()
+    urls = get_shard_urls(urls, shard, shards)
+
+    records = []
+    if urls:
+        # every shard is crawling the same sites at the same time
+        throttle.share_budgets(shards)
+        spider_kwargs = {"start_urls": urls, "follow": False}
+        if parse_workers:
+            wrapper = PoolSpiderWrapper(
+                LgbcePoolSpider, parse_workers, settings, **spider_kwargs
+            )
+        else:
+            wrapper = SpiderWrapper(LgbceSpider, settings, **spider_kwargs)
+        records = wrapper.run_spider()
+
+    # write to a temp file first so we never leave a half-written partial
+    tmp = output + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(
+            {"shard": shard, "shards": shards, "urls": urls, "records": records}, f
+        )
+    os.replace(tmp, output)
+
+
+def load_partial(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def merge_partials(paths, urls=None):
+    """
+    Combine the partial result files from every shard
+
+    Raises ShardException if any shard is missing or duplicated,
+    a record is in the wrong shard or a slug was found more than once.
+    If urls is given, it is the full list of review pages we expect
+    to have been crawled: we also raise ShardException if a shard was
+    given a different set of pages (e.g: a worker on another machine
+    saw a different version of the reviews page) or a slug we weren't
+    expecting was found, and log any expected review we got no record
+    for. Records are returned sorted by slug, so the result doesn't
+    depend on the order the workers finished in.
+    """
+    partials = [load_partial(path) for path in paths]
+    if not partials:
+        raise ShardException("No partial results to merge")
+
+    shards = partials[0]["shards"]
+    if any(partial["shards"] != shards for partial in partials):
+        raise ShardException(
+            "Partials disagree on the number of shards: %s"
+            % str(sorted(set(partial["shards"] for partial in partials)))
+        )
+
+    found = [partial["shard"] for partial in partials]
+    duplicates = sorted(set(shard for shard in found if found.count(shard) > 1))
+    if duplicates:
+        raise ShardException("Duplicate shards: %s" % str(duplicates))
+    missing = sorted(set(range(shards)) - set(found))
+    if missing:
+        raise ShardException("Missing shards: %s" % str(missing))
+
+    slugs = None
+    if urls is not None:
+        slugs = [get_slug(url) for url in urls]
+        for partial in sorted(partials, key=lambda partial: partial["shard"]):
+            expected = set(get_shard_urls(urls, partial["shard"], shards))
+            if set(partial["urls"]) != expected:
+                raise ShardException(
+                    "Shard %i crawled the wrong pages: missing %s, unexpected %s"
+                    % (
+                        partial["shard"],
+                        str(sorted(expected - set(partial["urls"]))),
+                        str(sorted(set(partial["urls"]) - expected)),
+                    )
+                )
+
+    records = {}
+    for partial in partials:
+        for record in partial["records"]:
+            slug = record["slug"]
+            if shard_for(slug, shards) != partial["shard"]:
+                raise ShardException(
+                    "Found '%s' in shard %i, expected shard %i"
+                    % (slug, partial["shard"], shard_for(slug, shards))
+                )
+            if slug in records:
+                raise ShardException("Found '%s' more than once" % slug)
+            if slugs is not None and slug not in slugs:
+                raise ShardException(
+                    "Unexpected slug: Found '%s', expected %s" % (slug, str(slugs))
+                )
+            records[slug] = record
+
+    if slugs is not None:
+        # e.g: a page which failed to download, or isn't a review page
+        missing = sorted(set(slugs) - set(records))
+        if missing:
+            logger.warning("No record found for: %s", ", ".join(missing))
+
+    return [records[slug] for slug in sorted(records)]
+
+
+def wait_for_shards(procs, interval=0.1):
+    # wait until every shard has finished or any of them has failed
+    while True:
+        codes = [proc.poll() for proc in procs]
+        failed = [shard for shard, code in enumerate(codes) if code not in (None, 0)]
+        if failed or None not in codes:
+            return failed
+        time.sleep(interval)
+
+
+def run_local_shards(urls, shards, settings=None, parse_workers=PARSE_WORKERS):
+    """
+    Crawl urls in a subprocess per shard on this machine
+    and return the merged records
+
+    Each worker crawls with the same Scrapy settings and number
+    of parse workers as we would have used ourselves.
+    """
+    # Workers run in our working directory, so relative paths
+    # (e.g: the HTTP cache) mean the same thing to them as to us
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [ROOT_DIR] + [path for path in [env.get("PYTHONPATH")] if path]
+    )
+
+    with tempfile.TemporaryDirectory() as workdir:
+        urls_path = os.path.join(workdir, "urls.json")
+        with open(urls_path, "w") as f:
+            json.dump(urls, f)
+        settings_path = os.path.join(workdir, "settings.json")
+        with open(settings_path, "w") as f:
+            json.dump(settings or {}, f)
+
+        paths = []
+        procs = []
+        try:
+            for shard in range(shards):
+                path = os.path.join(workdir, "shard-%i.json" % shard)
+                paths.append(path)
+                procs.append(
+                    subprocess.Popen(
+                        [
+                            sys.executable,
+                            "-m",
+                            "boundary_bot.sharding",
+                            "--shard",
+                            str(shard),
+                            "--shards",
+                            str(shards),
+                            "--urls",
+                            urls_path,
+                            "--output",
+                            path,
+                            "--settings",
+                            settings_path,
+                            "--parse-workers",
+                            str(parse_workers),
+                        ],
+                        env=env,
+                    )
+                )
+            failed = wait_for_shards(procs)
+        finally:
+            # if one shard fails (or we're interrupted) the merge can't
+            # succeed, so don't leave the others crawling
+            for proc in procs:
+                if proc.poll() is None:
+                    proc.kill()
+                    proc.wait()
+
+        if failed:
+            raise ShardException("Shards failed: %s" % str(failed))
+        return merge_partials(paths, urls)
+
+
+def add_shard_arguments(parser):
+    parser.add_argument("--shard", type=int, required=True, help="Shard to crawl")
+    parser.add_argument(
+        "--shards", type=int, required=True, help="Total number of shards"
+    )
+    parser.add_argument(
+        "--output", required=True, help="File to write the partial results to"
+    )
+    parser.add_argument(
+        "--urls",
+        help="JSON file listing the URLs to shard "
+        "(by default, every review on the current reviews page)",
+    )
+    parser.add_argument(
+        "--settings", help="JSON file of Scrapy settings for the spider"
+    )
+    parser.add_argument(
+        "--parse-workers",
+        type=int,
+        default=PARSE_WORKERS,
+        help="Number of processes to parse pages in (0 to parse in the crawler)",
+    )
+
+
+def run_shard_command(args, settings=None):
+    urls = None
+    if args.urls:
+        with open(args.urls) as f:
+            urls = json.load(f)
+    if args.settings:
+        with open(args.settings) as f:
+            settings = dict(settings or {}, **json.load(f))
+    crawl_shard(
+        args.shard, args.shards, args.output, urls, settings, args.parse_workers
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Crawl one shard of review pages")
+    add_shard_arguments(parser)
+    run_shard_command(parser.parse_args())
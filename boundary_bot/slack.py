@@ -26,6 +26,12 @@ class SlackHelper:
             message = ":rotating_light: " + message + " :alarm_clock:"
         self.messages.append(message)
 
+    def append_shapefile_changed_message(self, record):
+        self.messages.append(
+            "Shapefiles for %s boundary review have changed: %s"
+            % (record["name"], record["shapefiles"])
+        )
+
     def post_messages(self):
         client = SlackClient(SLACK_WEBHOOK_URL)
         for message in self.messages:
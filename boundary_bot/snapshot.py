@@ -0,0 +1,30 @@
+import atexit
+import os
+import shutil
+import tempfile
+
+
+SQLITE_PREFIX = "sqlite:///"
+
+
+def use_snapshot():
+    """
+    Point scraperwiki at a throwaway copy of the database
+
+    scraperwiki reads SCRAPERWIKI_DATABASE_NAME when it is imported,
+    so this must be called before anything imports scraperwiki.
+    Returns the path of the copy.
+    """
+    db_name = os.environ["SCRAPERWIKI_DATABASE_NAME"]
+    if not db_name.startswith(SQLITE_PREFIX):
+        raise ValueError("Can't take a snapshot of %s" % db_name)
+    path = db_name[len(SQLITE_PREFIX) :]
+
+    tmpdir = tempfile.mkdtemp()
+    atexit.register(shutil.rmtree, tmpdir, True)
+    copy = os.path.join(tmpdir, "snapshot.sqlite")
+    if path != ":memory:" and os.path.exists(path):
+        shutil.copyfile(path, copy)
+
+    os.environ["SCRAPERWIKI_DATABASE_NAME"] = SQLITE_PREFIX + copy
+    return copy
@@ -1,108 +1,146 @@
-import json
-import os
-import re
-
-import requests
 import scrapy
-import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from scrapy import signals
 from scrapy.crawler import CrawlerProcess
-from boundary_bot.common import is_eco, START_PAGE, REQUEST_HEADERS
+from scrapy.exceptions import DontCloseSpider
+from twisted.internet import reactor
+from boundary_bot.common import START_PAGE, REQUEST_HEADERS
+from boundary_bot.detail_page import DetailPage, find_made_link, parse_page
+
+
+# Replay responses from a local cache rather than fetching them again.
+# Entries never expire: delete the cache to start afresh.
+HTTP_CACHE_SETTINGS = {
+    "HTTPCACHE_ENABLED": True,
+    "HTTPCACHE_DIR": "httpcache",
+    "HTTPCACHE_EXPIRATION_SECS": 0,
+}
 
 
 class LgbceSpider(scrapy.Spider):
     name = "reviews"
     custom_settings = {
-        "CONCURRENT_REQUESTS": 5,  # keep the concurrent requests low
-        "DOWNLOAD_DELAY": 0.25,  # throttle the crawl speed a bit
+        # These are just where we start: AdaptiveThrottleMiddleware adjusts
+        # the concurrency and delay for each domain as the crawl goes,
+        # within the limits in boundary_bot.throttle.BUDGETS
+        "CONCURRENT_REQUESTS": 16,
+        "CONCURRENT_REQUESTS_PER_DOMAIN": 5,
+        "DOWNLOAD_DELAY": 0.25,
+        "DOWNLOADER_MIDDLEWARES": {
+            # above RetryMiddleware (550) so we see responses before it retries them
+            "boundary_bot.throttle.AdaptiveThrottleMiddleware": 555,
+        },
         "COOKIES_ENABLED": False,
         "USER_AGENT": "Mozilla/5.0 (Windows NT 10.0; WOW64; rv:56.0) Gecko/20100101 Firefox/56.0",
-        "FEED_FORMAT": "json",
         "DEFAULT_REQUEST_HEADERS": REQUEST_HEADERS,
     }
     allowed_domains = ["lgbce.org.uk"]
     start_urls = [START_PAGE]
+    # set this to False to only crawl start_urls
+    follow = True
+
+    def make_draft_request(self, draft_link, rec, **kwargs):
+        # Look up the made order as a request of its own, so it is throttled
+        # like any other without blocking the reactor. It isn't on one of
+        # our allowed_domains, so it has to skip the offsite filter.
+        kwargs["rec"] = rec
+        return scrapy.Request(
+            draft_link,
+            self.parse_draft,
+            cb_kwargs=kwargs,
+            errback=self.draft_failed,
+            dont_filter=True,
+        )
+
+    def parse_draft(self, response, rec, **kwargs):
+        rec["eco"] = find_made_link(response.text)
+        return self.finish_record(rec, **kwargs)
 
-    def get_shapefiles(self, response):
-        # find any links to zip files in the page
-        zipfiles = response.xpath(
-            "/html/body//a[contains(@href,'.zip')]/@href"
-        ).extract()
-
-        zipfiles = list(set(zipfiles))
-        if len(zipfiles) == 1:
-            # if we found exactly one link to a zipfile,
-            # assume that's what we're looking for
-            return zipfiles[0]
-
-        # Try being more specific
-        zipfiles = response.xpath(
-            "//a[contains(.,'Mapping')][contains(@href,'inal')]/@href"
-        ).extract()
-
-        if len(zipfiles) == 1:
-            return zipfiles[0]
-
-        return None
-
-    def get_made_link_from_draft_link(self, draft_link):
-        r = requests.get(draft_link)
-        rel_link = re.search(r"(wsi|uksi)\/\d+\/\d+\/(contents\/)?made", str(r.content))
-        if rel_link:
-            return "https://www.legislation.gov.uk/{}".format(rel_link.group())
-        else:
-            return None
-
-    def get_legislation(self, response):
-        # find any links to legislation.gov.uk in the pagec
-        legislation_links = response.xpath(
-            "/html/body//a[contains(@href,'legislation.gov.uk')]/@href"
-        ).extract()
-
-        made_links = [x for x in list(set(legislation_links)) if x.endswith("/made")]
-        draft_links = [x for x in list(set(legislation_links)) if "dsi" in x]
-        if len(made_links) == 1:
-            # if we found exactly link to a made order,
-            # assume that's what we're looking for
-            return made_links[0]
-        elif len(draft_links) == 1:
-            return self.get_made_link_from_draft_link(draft_links[0])
-        return None
+    def draft_failed(self, failure):
+        # keep the record, we just don't know where the made order is
+        self.logger.warning("Failed to fetch %s", failure.request.url)
+        return self.finish_record(**failure.request.cb_kwargs)
+
+    def finish_record(self, rec):
+        return [rec]
 
     def parse(self, response):
-        tabs = response.css("div.field--name-field-accordion-title")
-        if tabs:
-            title = tabs[0].xpath("text()").extract_first().strip()
-            rec = {
-                "slug": response.url.split("/")[-1],
-                "latest_event": title,
-                "shapefiles": None,
-                "eco": None,
-                "eco_made": 0,
-            }
-
-            rec["shapefiles"] = self.get_shapefiles(response)
-
-            # try to work out if the ECO is 'made'
-            eco_made_text_1 = "have now successfully completed a "
-            eco_made_text_2 = "of parliamentary scrutiny and will come into force"
-            div = (
-                response.css("div.field--name-field-accordion-body")
-                .extract_first()
-                .lower()
-                .replace("\xa0", " ")
-            )
-            # if rec["slug"] == "hammersmith-and-fulham":
-            # __import__("ipdb").set_trace()  # FIXME
+        page = DetailPage(response.selector.root)
+        if page.title is not None:
+            rec, draft_link = page.get_record(response.url)
+            if draft_link:
+                yield self.make_draft_request(draft_link, rec)
+            else:
+                yield rec
+
+        if not self.follow:
+            return
+        for next_page in page.follow_links:
+            yield response.follow(next_page, self.parse)
+
+
+class LgbcePoolSpider(LgbceSpider):
+
+    """
+    Spider which only fetches pages, and parses them in a process pool
+
+    Parsing with lxml is CPU-bound, so doing it in the reactor thread holds
+    up network callbacks. Instead we hand the raw response bytes to a pool
+    of worker processes and schedule any follow-up requests (further pages,
+    draft orders on legislation.gov.uk) as the results come back.
+    """
+
+    name = "reviews-pool"
+
+    def __init__(self, executor=None, on_record=None, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.executor = executor
+        self.on_record = on_record
+        self.pending = 0
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        crawler.signals.connect(spider.spider_idle, signal=signals.spider_idle)
+        return spider
+
+    def spider_idle(self, spider):
+        # the scheduler is empty, but we may be
+        # about to find more pages in a parse result
+        if self.pending:
+            raise DontCloseSpider
+
+    def parse(self, response):
+        self.pending += 1
+        future = self.executor.submit(
+            parse_page, response.url, response.body, response.encoding
+        )
+        future.add_done_callback(
+            lambda f: reactor.callFromThread(self.parsed, response.url, f)
+        )
+        return []
+
+    def parsed(self, url, future):
+        self.pending -= 1
+        try:
+            rec, draft_link, follow_links = future.result()
+        except Exception:
+            self.logger.exception("Failed to parse %s", url)
+            return
 
-            if is_eco(title) and eco_made_text_1 in div and eco_made_text_2 in div:
-                rec["eco_made"] = 1
-                rec["eco"] = self.get_legislation(response)
+        for next_page in follow_links if self.follow else []:
+            self.crawler.engine.crawl(scrapy.Request(next_page, self.parse), self)
 
-            yield rec
+        if rec is None:
+            return
+        if draft_link:
+            self.crawler.engine.crawl(self.make_draft_request(draft_link, rec), self)
+            return
+        self.on_record(rec)
 
-        for next_page in response.css("ul > li > div > span > a"):
-            if "all-reviews" in next_page.extract():
-                yield response.follow(next_page, self.parse)
+    def finish_record(self, rec):
+        self.on_record(rec)
+        return []
 
 
 class SpiderWrapper:
@@ -110,27 +148,46 @@ class SpiderWrapper:
     # Wrapper class that allows us to run a scrapy spider
     # and return the result as a list
 
-    def __init__(self, spider):
+    def __init__(self, spider, settings=None, **spider_kwargs):
         self.spider = spider
+        self.settings = settings
+        self.spider_kwargs = spider_kwargs
 
     def run_spider(self):
-        # Scrapy likes to dump its output to file
-        # so we will write it out to a file and read it back in.
-        # The 'proper' way to do this is probably to write a custom Exporter
-        # but this will do for now
+        # collect items as they are scraped
+        # rather than exporting them to a file and reading it back in
+        results = []
 
-        tmpfile = tempfile.NamedTemporaryFile().name
+        def item_scraped(item, response, spider):
+            results.append(item)
 
-        process = CrawlerProcess(
-            {
-                "FEED_URI": tmpfile,
-            }
-        )
-        process.crawl(self.spider)
+        process = CrawlerProcess(self.settings)
+        crawler = process.create_crawler(self.spider)
+        crawler.signals.connect(item_scraped, signal=signals.item_scraped)
+        process.crawl(crawler, **self.spider_kwargs)
         process.start()
 
-        results = json.load(open(tmpfile))
+        return results
 
-        os.remove(tmpfile)
 
-        return results
+class PoolSpiderWrapper(SpiderWrapper):
+
+    # Run a LgbcePoolSpider with a pool of worker processes,
+    # collecting records as they are parsed
+
+    def __init__(self, spider, workers, settings=None, **spider_kwargs):
+        super().__init__(spider, settings, **spider_kwargs)
+        self.workers = workers
+
+    def run_spider(self):
+        records = []
+        with ProcessPoolExecutor(self.workers) as executor:
+            process = CrawlerProcess(self.settings)
+            process.crawl(
+                self.spider,
+                executor=executor,
+                on_record=records.append,
+                **self.spider_kwargs
+            )
+            process.start()
+        return records
@@ -0,0 +1,229 @@
+import logging
+import time
+from urllib.parse import urlparse
+
+import requests
+
+
+logger = logging.getLogger(__name__)
+
+
+# Politeness limits for each domain we crawl.
+# The throttle never goes faster than max_concurrency requests
+# at a time with at least min_delay seconds between them.
+BUDGETS = {
+    "lgbce.org.uk": {"max_concurrency": 8, "min_delay": 0.1},
+    "legislation.gov.uk": {"max_concurrency": 2, "min_delay": 1.0},
+}
+DEFAULT_BUDGET = {"max_concurrency": 4, "min_delay": 0.25}
+# How many processes are crawling at the same time (e.g: one per shard).
+# The budgets are for all of them together, so each process gets a share.
+PROCESSES = {"count": 1}
+
+
+class DomainThrottle:
+
+    """
+    Delay and concurrency for requests to one domain
+
+    Every response is recorded with its latency and status code.
+    We back off hard on 429s and server errors, ease off when
+    responses are slow and speed up again (a step at a time,
+    within the politeness limits) while they are fast.
+    """
+
+    # responses slower than this are 'slow'
+    # and faster than half of this are 'fast'
+    TARGET_LATENCY = 1.0
+    # the shortest delay to back off to if we're currently not waiting at all
+    STEP_DELAY = 0.1
+    BACKOFF_DELAY = 1.0
+    MAX_DELAY = 60.0
+
+    def __init__(
+        self, domain, max_concurrency, min_delay, concurrency=None, delay=None
+    ):
+        self.domain = domain
+        self.max_concurrency = max_concurrency
+        self.min_delay = min_delay
+        self.concurrency = 1
+        self.delay = min_delay
+        self.fast_responses = 0
+        self.last_request = None
+        self.set(
+            concurrency if concurrency is not None else max_concurrency // 2,
+            delay if delay is not None else min_delay,
+        )
+
+    def set(self, concurrency, delay):
+        # clamp to our limits, returning True if anything changed
+        concurrency = min(max(concurrency, 1), self.max_concurrency)
+        delay = min(max(delay, self.min_delay), self.MAX_DELAY)
+        changed = (concurrency, delay) != (self.concurrency, self.delay)
+        self.concurrency = concurrency
+        self.delay = delay
+        return changed
+
+    def record(self, latency, status=None, retry_after=None):
+        """
+        Adjust the throttle after a response
+
+        status should be None if the request failed without a response.
+        Returns True if the concurrency or delay has changed.
+        """
+        if status is None or status == 429 or status >= 500:
+            stage = "backing off after %s" % (status or "failed request")
+            self.fast_responses = 0
+            changed = self.set(
+                self.concurrency // 2,
+                max(self.delay * 2, retry_after or 0, self.BACKOFF_DELAY),
+            )
+        elif latency > self.TARGET_LATENCY:
+            stage = "slowing down after a %.2fs response" % latency
+            self.fast_responses = 0
+            changed = self.set(
+                self.concurrency - 1, max(self.delay * 1.5, self.STEP_DELAY)
+            )
+        elif latency < self.TARGET_LATENCY / 2:
+            # wait for a full round of fast responses before we speed up
+            self.fast_responses += 1
+            if self.fast_responses < self.concurrency:
+                return False
+            stage = "speeding up"
+            self.fast_responses = 0
+            changed = self.set(self.concurrency + 1, self.delay * 0.75)
+        else:
+            return False
+
+        if changed:
+            logger.info(
+                "%s: %s: concurrency %i, delay %.2fs",
+                self.domain,
+                stage,
+                self.concurrency,
+                self.delay,
+            )
+        return changed
+
+    def wait(self):
+        # for blocking callers: sleep until we're allowed to make the next request
+        now = time.monotonic()
+        if self.last_request is not None:
+            remaining = self.last_request + self.delay - now
+            if remaining > 0:
+                time.sleep(remaining)
+                now += remaining
+        self.last_request = now
+
+
+def get_budget(domain):
+    budget = DEFAULT_BUDGET
+    for suffix, domain_budget in BUDGETS.items():
+        if domain == suffix or domain.endswith("." + suffix):
+            budget = domain_budget
+            break
+    # Every process gets at least one request at a time, but spacing
+    # them out keeps the combined request rate within the budget
+    processes = PROCESSES["count"]
+    return {
+        "max_concurrency": max(budget["max_concurrency"] // processes, 1),
+        "min_delay": budget["min_delay"] * processes,
+    }
+
+
+def share_budgets(processes):
+    """
+    Split the budgets between this and other processes crawling at once
+
+    Call this before making any requests.
+    """
+    PROCESSES["count"] = max(processes, 1)
+    THROTTLES.clear()
+
+
+THROTTLES = {}
+
+
+def get_throttle(domain, concurrency=None, delay=None):
+    # one shared throttle per domain
+    if domain not in THROTTLES:
+        throttle = DomainThrottle(
+            domain, concurrency=concurrency, delay=delay, **get_budget(domain)
+        )
+        logger.info(
+            "%s: starting with concurrency %i, delay %.2fs",
+            domain,
+            throttle.concurrency,
+            throttle.delay,
+        )
+        THROTTLES[domain] = throttle
+    return THROTTLES[domain]
+
+
+def get_retry_after(headers):
+    try:
+        return float(headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        # missing, or an HTTP date
+        return None
+
+
+def get(url, **kwargs):
+    """
+    requests.get(), throttled with the same budgets as the spider
+    """
+    throttle = get_throttle(urlparse(url).hostname)
+    throttle.wait()
+    start = time.monotonic()
+    try:
+        r = requests.get(url, **kwargs)
+    except requests.exceptions.RequestException:
+        throttle.record(time.monotonic() - start)
+        raise
+    throttle.record(time.monotonic() - start, r.status_code, get_retry_after(r.headers))
+    return r
+
+
+class AdaptiveThrottleMiddleware:
+
+    """
+    Scrapy downloader middleware which applies a DomainThrottle
+    to each downloader slot (by default, one slot per hostname)
+    """
+
+    def __init__(self, crawler):
+        self.crawler = crawler
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def get_slot(self, request):
+        key = request.meta.get("download_slot")
+        return self.crawler.engine.downloader.slots.get(key)
+
+    def update_slot(self, request, status=None, retry_after=None):
+        slot = self.get_slot(request)
+        if slot is None:
+            return
+        # failed requests don't have a download_latency
+        latency = request.meta.get("download_latency", 0)
+        # start from whatever the spider's settings gave the slot
+        throttle = get_throttle(
+            urlparse(request.url).hostname,
+            concurrency=slot.concurrency,
+            delay=slot.delay,
+        )
+        throttle.record(latency, status, retry_after)
+        slot.concurrency = throttle.concurrency
+        slot.delay = throttle.delay
+
+    def process_response(self, request, response, spider):
+        if "cached" in response.flags:
+            # we didn't make a request, so this tells us nothing
+            return response
+        self.update_slot(request, response.status, get_retry_after(response.headers))
+        return response
+
+    def process_exception(self, request, exception, spider):
+        self.update_slot(request)
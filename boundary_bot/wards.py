@@ -0,0 +1,294 @@
+import os
+import struct
+import zipfile
+
+import numpy as np
+import scraperwiki
+from boundary_bot import db
+
+
+# Polygon, PolygonZ and PolygonM all start with the same fields
+POLYGON_TYPES = (5, 15, 25)
+NULL_SHAPE = 0
+
+
+class Wards:
+
+    """
+    Ward names, bounding boxes and areas read from a shapefile
+
+    bboxes is an (n, 4) array of (min_x, min_y, max_x, max_y)
+    and areas is an array of length n, both in the units of
+    the shapefile's coordinate reference system
+    """
+
+    def __init__(self, names, bboxes, areas):
+        self.names = names
+        self.bboxes = bboxes
+        self.areas = areas
+
+    def __len__(self):
+        return len(self.names)
+
+    def get_bbox(self):
+        # bounding box of all the wards
+        if not len(self):
+            return (None, None, None, None)
+        return (
+            float(np.nanmin(self.bboxes[:, 0])),
+            float(np.nanmin(self.bboxes[:, 1])),
+            float(np.nanmax(self.bboxes[:, 2])),
+            float(np.nanmax(self.bboxes[:, 3])),
+        )
+
+
+def choose_layer(names):
+    # a zip may contain several layers (e.g: wards and parishes)
+    # so prefer one which looks like wards
+    layers = sorted(
+        n for n in names if n.lower().endswith(".shp") and not n.startswith("__MACOSX")
+    )
+    if not layers:
+        raise ValueError("No shapefile found in zip")
+    for layer in layers:
+        if "ward" in os.path.basename(layer).lower():
+            return layer
+    return layers[0]
+
+
+def find_member(names, layer, extension):
+    stem = os.path.splitext(layer)[0].lower()
+    for name in names:
+        if name.lower() == stem + extension:
+            return name
+    raise ValueError("No %s file found for %s" % (extension, layer))
+
+
+def read_geometry(buf):
+    """
+    Read the polygons in a .shp file
+
+    Returns a tuple of (record_starts, ring_starts, x, y) where x and y are
+    every vertex in the file, ring_starts indexes the first vertex of each
+    ring and record_starts indexes the first ring of each record
+    """
+    point_offset = 0
+    ring_offset = 0
+    record_starts = []
+    ring_starts = []
+    points = []
+
+    pos = 100  # skip the file header
+    while pos < len(buf):
+        # record header is big-endian, the content is little-endian
+        _, length = struct.unpack_from(">ii", buf, pos)
+        content = pos + 8
+        pos = content + length * 2
+
+        (shape_type,) = struct.unpack_from("<i", buf, content)
+        record_starts.append(ring_offset)
+        if shape_type == NULL_SHAPE:
+            continue
+        if shape_type not in POLYGON_TYPES:
+            raise ValueError("Unexpected shape type %i" % shape_type)
+
+        num_parts, num_points = struct.unpack_from("<ii", buf, content + 36)
+        parts = np.frombuffer(buf, "<i4", num_parts, content + 44)
+        ring_starts.append(parts + point_offset)
+        points.append(
+            np.frombuffer(buf, "<f8", num_points * 2, content + 44 + num_parts * 4)
+        )
+        point_offset += num_points
+        ring_offset += num_parts
+
+    if points:
+        xy = np.concatenate(points).reshape(-1, 2)
+        ring_starts = np.concatenate(ring_starts)
+    else:
+        xy = np.empty((0, 2))
+        ring_starts = np.empty(0, dtype=int)
+    return (np.array(record_starts, dtype=int), ring_starts, xy[:, 0], xy[:, 1])
+
+
+def summarise_geometry(record_starts, ring_starts, x, y):
+    """
+    Calculate a bounding box and area for each record
+
+    Everything is done with whole-array operations:
+    no Python loops over vertices or rings
+    """
+    num_records = len(record_starts)
+    num_rings = len(ring_starts)
+    bboxes = np.full((num_records, 4), np.nan)
+    areas = np.zeros(num_records)
+    if not num_rings:
+        return (bboxes, areas)
+
+    # null shapes have no rings, so only reduce over records with geometry
+    ring_ends = np.append(record_starts[1:], num_rings)
+    has_rings = ring_ends > record_starts
+    first_rings = record_starts[has_rings]
+    first_points = ring_starts[first_rings]
+
+    bboxes[has_rings, 0] = np.minimum.reduceat(x, first_points)
+    bboxes[has_rings, 1] = np.minimum.reduceat(y, first_points)
+    bboxes[has_rings, 2] = np.maximum.reduceat(x, first_points)
+    bboxes[has_rings, 3] = np.maximum.reduceat(y, first_points)
+
+    # shoelace formula: each vertex contributes a cross product with the
+    # next one, except where the next vertex belongs to a different ring
+    cross = np.zeros(len(x))
+    cross[:-1] = x[:-1] * y[1:] - x[1:] * y[:-1]
+    cross[ring_starts[1:] - 1] = 0
+    ring_areas = np.add.reduceat(cross, ring_starts) / 2
+
+    # outer rings are clockwise and holes are anti-clockwise
+    # so summing the signed areas subtracts the holes
+    areas[has_rings] = np.abs(np.add.reduceat(ring_areas, first_rings))
+    return (bboxes, areas)
+
+
+def read_names(buf):
+    """
+    Read the ward names from a .dbf file
+
+    Returns a tuple of (names, live) where live is a boolean array
+    which is False for records flagged as deleted
+    """
+    num_records, header_length, record_length = struct.unpack_from("<IHH", buf, 4)
+
+    fields = []
+    offset = 1  # each record starts with a deletion flag
+    pos = 32
+    while buf[pos] != 0x0D:
+        name = bytes(buf[pos : pos + 11]).split(b"\x00")[0].decode("ascii")
+        field_type = chr(buf[pos + 11])
+        length = buf[pos + 16]
+        fields.append((name, field_type, length, offset))
+        offset += length
+        pos += 32
+
+    text_fields = [f for f in fields if f[1] == "C"]
+    if not text_fields:
+        raise ValueError("No text fields found in .dbf")
+    name_fields = [f for f in text_fields if "NAME" in f[0].upper()]
+    ward_fields = [f for f in name_fields if "WARD" in f[0].upper()]
+    name, _, length, offset = (ward_fields or name_fields or text_fields)[0]
+
+    # pick the name column straight out of the fixed-width records
+    dtype = np.dtype(
+        {
+            "names": ["deleted", name],
+            "formats": ["S1", "S%i" % length],
+            "offsets": [0, offset],
+            "itemsize": record_length,
+        }
+    )
+    records = np.frombuffer(buf, dtype, num_records, header_length)
+    names = [n.decode("utf-8", "replace").strip() for n in records[name]]
+    return (names, records["deleted"] != b"*")
+
+
+def read_wards(path):
+    """
+    Read the wards from a shapefile zip
+
+    Only the .shp and .dbf for the ward layer are read from the zip,
+    so nothing is extracted to disk
+    """
+    with zipfile.ZipFile(path) as zf:
+        names = zf.namelist()
+        layer = choose_layer(names)
+        shp = zf.read(layer)
+        dbf = zf.read(find_member(names, layer, ".dbf"))
+
+    ward_names, live = read_names(dbf)
+    bboxes, areas = summarise_geometry(*read_geometry(shp))
+    if len(ward_names) != len(areas):
+        raise ValueError(
+            "Found %i names but %i shapes in %s" % (len(ward_names), len(areas), layer)
+        )
+    # deleted records still have a shape, so drop both
+    ward_names = [name for name, keep in zip(ward_names, live) if keep]
+    return Wards(ward_names, bboxes[live], areas[live])
+
+
+class WardStore:
+
+    """
+    Precomputed summaries of the wards in each review's final shapefiles
+
+    This allows us to answer questions like "how many wards does X have
+    after the review" without downloading and parsing the zip again.
+    """
+
+    SUMMARY_TABLE_NAME = "lgbce_ward_summaries"
+    TABLE_NAME = "lgbce_wards"
+
+    def __init__(self):
+        scraperwiki.sql.execute(
+            """
+            CREATE TABLE IF NOT EXISTS %s (
+                slug TEXT PRIMARY KEY,
+                sha256 TEXT,
+                ward_count INT,
+                min_x REAL,
+                min_y REAL,
+                max_x REAL,
+                max_y REAL
+            );"""
+            % self.SUMMARY_TABLE_NAME
+        )
+        scraperwiki.sql.execute(
+            """
+            CREATE TABLE IF NOT EXISTS %s (
+                slug TEXT,
+                name TEXT,
+                min_x REAL,
+                min_y REAL,
+                max_x REAL,
+                max_y REAL,
+                area REAL
+            );"""
+            % self.TABLE_NAME
+        )
+        scraperwiki.sql.execute(
+            "CREATE INDEX IF NOT EXISTS %s_slug ON %s (slug);"
+            % (self.TABLE_NAME, self.TABLE_NAME)
+        )
+
+    def get_summary(self, slug):
+        result = scraperwiki.sql.select(
+            "* FROM %s WHERE slug=?" % (self.SUMMARY_TABLE_NAME), slug
+        )
+        if len(result) == 1:
+            return result[0]
+        return None
+
+    def save(self, slug, sha256, wards):
+        min_x, min_y, max_x, max_y = wards.get_bbox()
+        db.save(
+            unique_keys=["slug"],
+            data={
+                "slug": slug,
+                "sha256": sha256,
+                "ward_count": len(wards),
+                "min_x": min_x,
+                "min_y": min_y,
+                "max_x": max_x,
+                "max_y": max_y,
+            },
+            table_name=self.SUMMARY_TABLE_NAME,
+        )
+        db.execute("DELETE FROM %s WHERE slug=?" % (self.TABLE_NAME), [slug])
+        if not len(wards):
+            return
+        rows = [
+            [slug, name] + [None if np.isnan(v) else v for v in bbox] + [area]
+            for name, bbox, area in zip(
+                wards.names, wards.bboxes.tolist(), wards.areas.tolist()
+            )
+        ]
+        db.execute(
+            "INSERT INTO %s VALUES (?, ?, ?, ?, ?, ?, ?)" % (self.TABLE_NAME), rows
+        )
@@ -1,4 +1,6 @@
-from boundary_bot.scraper import LgbceScraper
+import argparse
+from boundary_bot.sharding import add_shard_arguments, run_shard_command
+from boundary_bot.snapshot import use_snapshot
 
 
 """
@@ -12,6 +14,159 @@ BOOTSTRAP_MODE = False
 SEND_NOTIFICATIONS = not (BOOTSTRAP_MODE)
 
 
-if __name__ == "__main__":
+def get_parser():
+    parser = argparse.ArgumentParser(
+        description="Scrape boundary reviews from the LGBCE website"
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Print the changes we would make and the notifications we would "
+        "send, without writing to the DB or sending anything",
+    )
+    parser.add_argument(
+        "--http-cache",
+        action="store_true",
+        help="Replay review pages from a local HTTP cache where we can",
+    )
+    subparsers = parser.add_subparsers(dest="command")
+
+    archive = subparsers.add_parser(
+        "archive",
+        help="Crawl the full archive of reviews. Resumes an interrupted crawl.",
+    )
+    archive.add_argument(
+        "--restart",
+        action="store_true",
+        help="Start the crawl again from the beginning",
+    )
+
+    shard = subparsers.add_parser(
+        "shard",
+        help="Crawl one shard of the review pages and write the partial results "
+        "to a file. Combine the partials with the merge command.",
+    )
+    add_shard_arguments(shard)
+
+    merge = subparsers.add_parser(
+        "merge",
+        help="Scrape using the partial results from every shard "
+        "instead of crawling the review pages",
+    )
+    merge.add_argument("partials", nargs="+", help="Partial result files")
+
+    serve = subparsers.add_parser(
+        "serve", help="Serve the reviews table over HTTP (read-only)"
+    )
+    serve.add_argument("--host", default="127.0.0.1", help="Host to listen on")
+    serve.add_argument("--port", type=int, default=8000, help="Port to listen on")
+
+    webhooks = subparsers.add_parser(
+        "webhooks", help="Manage the webhooks change events are posted to"
+    )
+    webhooks.add_argument("action", choices=["add", "remove", "list", "deliver"])
+    webhooks.add_argument("url", nargs="?", help="Webhook URL (for add and remove)")
+    webhooks.add_argument(
+        "--since",
+        type=int,
+        help="When adding a webhook, replay events after this id "
+        "(by default it only gets new events)",
+    )
+
+    search = subparsers.add_parser(
+        "search",
+        help="Search review names, latest events and event history. "
+        "Falls back to a fuzzy match on names if nothing matches the text.",
+    )
+    search.add_argument("text", nargs="+", help="Text to search for")
+    search.add_argument(
+        "--limit", type=int, default=20, help="Maximum number of reviews to show"
+    )
+    search.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="Rebuild the search index from scratch first",
+    )
+    search.add_argument(
+        "--no-council-names",
+        action="store_true",
+        help="Don't fetch council names from the register for the fuzzy match",
+    )
+
+    return parser
+
+
+def search(args):
+    from boundary_bot.search import SearchIndex
+
+    index = SearchIndex(use_council_names=not args.no_council_names)
+    if args.rebuild:
+        index.rebuild()
+    results = index.search(" ".join(args.text), args.limit)
+    if not results:
+        print("No matches")
+    for result in results:
+        print("%s: %s (%s)" % (result["slug"], result["name"], result["source"]))
+        if result["snippet"]:
+            print("    %s" % result["snippet"])
+
+
+def manage_webhooks(args):
+    from boundary_bot.events import EventStore
+
+    store = EventStore()
+    if args.action in ("add", "remove") and not args.url:
+        raise SystemExit("A URL is required to %s a webhook" % args.action)
+    if args.action == "add":
+        store.add_webhook(args.url, args.since)
+    elif args.action == "remove":
+        store.remove_webhook(args.url)
+    elif args.action == "list":
+        for webhook in store.get_webhooks():
+            print("%s (delivered up to event %i)" % (webhook["url"], webhook["cursor"]))
+    elif args.action == "deliver":
+        store.deliver()
+
+
+def get_scraper(args):
+    from boundary_bot.scraper import LgbceScraper
+    from boundary_bot.spider import HTTP_CACHE_SETTINGS
+
     scraper = LgbceScraper(BOOTSTRAP_MODE, SEND_NOTIFICATIONS)
-    scraper.scrape()
+    scraper.dry_run = args.dry_run
+    if args.http_cache:
+        scraper.spider_settings = HTTP_CACHE_SETTINGS
+    return scraper
+
+
+if __name__ == "__main__":
+    args = get_parser().parse_args()
+
+    if args.dry_run:
+        # work on a copy of the DB so we can't change the real one
+        # (this must happen before we import anything that uses scraperwiki)
+        use_snapshot()
+
+    if args.command == "archive":
+        from boundary_bot.archive import crawl_archive
+
+        crawl_archive(restart=args.restart)
+    elif args.command == "serve":
+        from boundary_bot.api import serve
+
+        serve(args.host, args.port)
+    elif args.command == "webhooks":
+        manage_webhooks(args)
+    elif args.command == "search":
+        search(args)
+    elif args.command == "shard":
+        from boundary_bot.spider import HTTP_CACHE_SETTINGS
+
+        run_shard_command(args, HTTP_CACHE_SETTINGS if args.http_cache else None)
+    elif args.command == "merge":
+        scraper = get_scraper(args)
+        scraper.partials = args.partials
+        scraper.scrape()
+    else:
+        scraper = get_scraper(args)
+        scraper.scrape()
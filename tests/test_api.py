@@ -0,0 +1,240 @@
+import datetime
+import json
+import os
+import scraperwiki
+import shutil
+import sqlite3
+import tempfile
+from unittest import mock, TestCase
+from wsgiref.util import setup_testing_defaults
+from boundary_bot.api import ReviewsApp
+from boundary_bot.records import Review
+from boundary_bot.scraper import LgbceScraper
+from data_provider import base_data
+
+
+class ReviewsAppTests(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        path = os.path.join(self.dir, "data.sqlite")
+        conn = sqlite3.connect(path)
+        conn.execute(
+            "CREATE TABLE lgbce_reviews (slug TEXT PRIMARY KEY, name TEXT, "
+            "register_code TEXT, url TEXT, status TEXT, latest_event TEXT, "
+            "shapefiles TEXT, eco TEXT, eco_made INT DEFAULT 0)"
+        )
+        conn.execute(
+            "CREATE TABLE lgbce_review_changes (slug TEXT PRIMARY KEY, "
+            "changed_at TEXT, deleted INT DEFAULT 0, seq INTEGER)"
+        )
+        for slug, changed_at, seq in [
+            ("allerdale", "2020-01-01T00:00:00", 1),
+            ("ashford", "2020-01-02T00:00:00", 2),
+            ("babergh", "2020-01-03T00:00:00", 4),
+        ]:
+            record = Review(**base_data[slug])
+            record["latest_event"] = "foo"
+            conn.execute(
+                "INSERT INTO lgbce_reviews VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                record.as_tuple(),
+            )
+            conn.execute(
+                "INSERT INTO lgbce_review_changes VALUES (?, ?, 0, ?)",
+                (slug, changed_at, seq),
+            )
+        conn.execute(
+            "INSERT INTO lgbce_review_changes "
+            "VALUES ('gone', '2020-01-02T12:00:00', 1, 3)"
+        )
+        conn.execute(
+            "CREATE TABLE lgbce_change_events (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "type TEXT, slug TEXT, created_at TEXT, review TEXT)"
+        )
+        for slug in ["allerdale", "ashford", "babergh"]:
+            conn.execute(
+                "INSERT INTO lgbce_change_events (type, slug, created_at, review) "
+                "VALUES ('new_review', ?, '2020-01-01T00:00:00', '{}')",
+                (slug,),
+            )
+        conn.commit()
+        conn.close()
+        self.app = ReviewsApp(path)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def get(self, path, query="", headers=None):
+        environ = {"PATH_INFO": path, "QUERY_STRING": query}
+        environ.update(headers or {})
+        setup_testing_defaults(environ)
+        response = {}
+
+        def start_response(status, headers):
+            response["status"] = status
+            response["headers"] = dict(headers)
+
+        body = b"".join(self.app(environ, start_response))
+        return (response["status"], response["headers"], body)
+
+    def get_json(self, path, query=""):
+        status, headers, body = self.get(path, query)
+        self.assertEqual("200 OK", status)
+        return json.loads(body.decode("utf-8"))
+
+    def test_reviews(self):
+        data = self.get_json("/reviews")
+        self.assertEqual(
+            ["allerdale", "ashford", "babergh"], [r["slug"] for r in data["reviews"]]
+        )
+        self.assertEqual(4, data["last_change"])
+        self.assertNotIn("deleted", data)
+
+    def test_filters(self):
+        data = self.get_json("/reviews", "status=Current+Reviews")
+        self.assertEqual(["babergh"], [r["slug"] for r in data["reviews"]])
+        data = self.get_json("/reviews", "status=Recent+Reviews&eco_made=1")
+        self.assertEqual([], data["reviews"])
+
+        status, headers, body = self.get("/reviews", "eco_made=yes")
+        self.assertEqual("400 Bad Request", status)
+
+    def test_since(self):
+        data = self.get_json("/reviews", "since=1")
+        self.assertEqual(["ashford", "babergh"], [r["slug"] for r in data["reviews"]])
+        self.assertEqual(["gone"], data["deleted"])
+
+        data = self.get_json("/reviews", "since=%i" % data["last_change"])
+        self.assertEqual([], data["reviews"])
+        self.assertEqual([], data["deleted"])
+
+        data = self.get_json("/reviews", "since=0")
+        self.assertEqual(3, len(data["reviews"]))
+
+        status, headers, body = self.get("/reviews", "since=2020-01-01T00:00:00")
+        self.assertEqual("400 Bad Request", status)
+
+    def test_review(self):
+        data = self.get_json("/reviews/babergh")
+        self.assertEqual("Babergh", data["name"])
+
+        status, headers, body = self.get("/reviews/foo")
+        self.assertEqual("404 Not Found", status)
+
+    def test_etag(self):
+        status, headers, body = self.get("/reviews")
+        etag = headers["ETag"]
+
+        status, headers, body = self.get(
+            "/reviews", headers={"HTTP_IF_NONE_MATCH": etag}
+        )
+        self.assertEqual("304 Not Modified", status)
+        self.assertEqual(b"", body)
+
+        status, headers, body = self.get(
+            "/reviews", "status=Current+Reviews", headers={"HTTP_IF_NONE_MATCH": etag}
+        )
+        self.assertEqual("200 OK", status)
+
+    def test_read_only(self):
+        status, headers, body = self.get(
+            "/reviews/babergh", headers={"REQUEST_METHOD": "DELETE"}
+        )
+        self.assertEqual("405 Method Not Allowed", status)
+        with self.assertRaises(sqlite3.OperationalError):
+            self.app.get_connection().execute("DELETE FROM lgbce_reviews")
+
+    def get_stream(self, query="", headers=None):
+        environ = {"PATH_INFO": "/events", "QUERY_STRING": query}
+        environ.update(headers or {})
+        setup_testing_defaults(environ)
+        response = {}
+
+        def start_response(status, headers):
+            response["status"] = status
+            response["headers"] = dict(headers)
+
+        stream = self.app(environ, start_response)
+        self.assertEqual("200 OK", response["status"])
+        self.assertEqual("text/event-stream", response["headers"]["Content-Type"])
+        return stream
+
+    def test_events(self):
+        stream = self.get_stream(headers={"HTTP_LAST_EVENT_ID": "1"})
+        event = next(stream).decode("utf-8")
+        self.assertTrue(event.startswith("id: 2\nevent: new_review\ndata: "))
+        self.assertEqual("ashford", json.loads(event.split("data: ")[1])["slug"])
+        self.assertTrue(next(stream).startswith(b"id: 3\n"))
+
+        # nothing else yet
+        with mock.patch("boundary_bot.api.time.sleep") as sleep:
+            self.assertEqual(b": keepalive\n\n", next(stream))
+            next(stream)
+        sleep.assert_called_once_with(5)
+
+    def test_events_from_now(self):
+        stream = self.get_stream()
+        with mock.patch("boundary_bot.api.time.sleep"):
+            self.assertEqual(b": keepalive\n\n", next(stream))
+
+    def test_events_since(self):
+        stream = self.get_stream("since=2")
+        self.assertTrue(next(stream).startswith(b"id: 3\n"))
+
+    def test_events_head(self):
+        stream = self.get_stream(headers={"REQUEST_METHOD": "HEAD"})
+        self.assertEqual([b""], stream)
+
+    def test_events_lifetime(self):
+        stream = self.get_stream("since=2")
+        with mock.patch("boundary_bot.api.STREAM_LIFETIME", 0), mock.patch(
+            "boundary_bot.api.time.sleep"
+        ) as sleep:
+            # pending events are still sent before the stream ends
+            self.assertEqual([b"id: 3\n"], [event[:6] for event in stream])
+        sleep.assert_not_called()
+
+
+@mock.patch("boundary_bot.code_matcher.CodeMatcher.get_data", lambda x: [])
+class ChangesTests(TestCase):
+    def setUp(self):
+        scraperwiki.sqlite.execute("DROP TABLE IF EXISTS lgbce_reviews;")
+        scraperwiki.sqlite.execute("DROP TABLE IF EXISTS lgbce_review_changes;")
+
+    def get_changes(self):
+        return {
+            row["slug"]: (row["changed_at"], row["deleted"], row["seq"])
+            for row in scraperwiki.sql.select("* FROM lgbce_review_changes")
+        }
+
+    def test_changes(self):
+        scraper = LgbceScraper(False, False)
+        scraper.data = {
+            "allerdale": Review(**base_data["allerdale"]),
+            "babergh": Review(**base_data["babergh"]),
+        }
+        with mock.patch.object(
+            scraper, "get_now", return_value=datetime.datetime(2020, 1, 1)
+        ):
+            scraper.save()
+        self.assertEqual(
+            {
+                "allerdale": ("2020-01-01T00:00:00", 0, 1),
+                "babergh": ("2020-01-01T00:00:00", 0, 2),
+            },
+            self.get_changes(),
+        )
+
+        scraper.data["babergh"]["latest_event"] = "foo"
+        del scraper.data["allerdale"]
+        with mock.patch.object(
+            scraper, "get_now", return_value=datetime.datetime(2020, 1, 2)
+        ):
+            scraper.save()
+            scraper.cleanup()
+        self.assertEqual(
+            {
+                "allerdale": ("2020-01-02T00:00:00", 1, 4),
+                "babergh": ("2020-01-02T00:00:00", 0, 3),
+            },
+            self.get_changes(),
+        )
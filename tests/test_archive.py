@@ -0,0 +1,155 @@
+import os
+import scraperwiki
+from unittest import mock, TestCase
+from scrapy.http import HtmlResponse, Request, TextResponse
+from boundary_bot.archive import ArchiveStore, LgbceArchiveSpider
+
+
+def mock_response(file_name, url):
+    dirname = os.path.dirname(os.path.abspath(__file__))
+    with open(os.path.join(dirname, file_name), "rb") as f:
+        body = f.read()
+    request = Request(url=url, meta={"frontier_url": url})
+    return HtmlResponse(url=url, request=request, body=body)
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        scraperwiki.sqlite.execute("DROP TABLE IF EXISTS lgbce_archive;")
+        scraperwiki.sqlite.execute("DROP TABLE IF EXISTS lgbce_archive_frontier;")
+
+    def get_spider(self):
+        return LgbceArchiveSpider(store=ArchiveStore())
+
+    def test_new_crawl(self):
+        spider = self.get_spider()
+        requests = list(spider.start_requests())
+        self.assertEqual(
+            ["http://www.lgbce.org.uk/all-reviews"], [r.url for r in requests]
+        )
+
+    def test_parse_and_resume(self):
+        spider = self.get_spider()
+        list(spider.start_requests())
+
+        requests = spider.parse(
+            mock_response(
+                "fixtures/index/valid.html", "http://www.lgbce.org.uk/all-reviews"
+            )
+        )
+        self.assertEqual(4, len(requests))
+        # we've already queued these, so shouldn't queue them again
+        self.assertEqual(
+            [],
+            spider.parse(
+                mock_response(
+                    "fixtures/index/valid.html", "http://www.lgbce.org.uk/all-reviews"
+                )
+            ),
+        )
+
+        spider.parse(
+            mock_response(
+                "fixtures/detail/no_eco.html",
+                "http://www.lgbce.org.uk/all-reviews/eastern/suffolk/babergh",
+            )
+        )
+        # nothing is written until we checkpoint
+        self.assertEqual([], scraperwiki.sql.select("* FROM lgbce_archive"))
+        spider.spider_closed(spider)
+
+        records = scraperwiki.sql.select("* FROM lgbce_archive")
+        self.assertEqual(1, len(records))
+        self.assertEqual("babergh", records[0]["slug"])
+        self.assertEqual("Babergh", records[0]["name"])
+        self.assertEqual(
+            "Consultation on draft recommendations", records[0]["latest_event"]
+        )
+
+        # a new crawl should resume with the pages we haven't visited yet
+        spider = self.get_spider()
+        requests = list(spider.start_requests())
+        self.assertEqual(
+            [
+                "http://www.lgbce.org.uk/all-reviews/south-east/hampshire/basingstoke-and-deane",
+                "http://www.lgbce.org.uk/all-reviews/north-west/cumbria/allerdale",
+                "http://www.lgbce.org.uk/all-reviews/south-east/kent/ashford",
+            ],
+            [r.url for r in requests],
+        )
+
+        # unless we start again
+        spider.store.reset()
+        requests = list(spider.start_requests())
+        self.assertEqual(
+            ["http://www.lgbce.org.uk/all-reviews"], [r.url for r in requests]
+        )
+
+    def test_canonical_links(self):
+        spider = self.get_spider()
+        url = "http://www.lgbce.org.uk/all-reviews"
+        spider.store.add(url)
+        body = b"""<html><body>
+            <a href="/all-reviews/eastern/suffolk/babergh">Babergh</a>
+            <a href="/all-reviews/eastern/suffolk/babergh#main">Babergh</a>
+            <a href="http://lgbce.org.uk/all-reviews/north-west">North West</a>
+            <a href="https://twitter.com/all-reviews">Twitter</a>
+            <a href="http://www.lgbce.org.uk.example.com/all-reviews">Spoof</a>
+        </body></html>"""
+        response = HtmlResponse(
+            url=url, request=Request(url=url, meta={"frontier_url": url}), body=body
+        )
+        requests = spider.parse(response)
+        self.assertEqual(
+            [
+                "http://www.lgbce.org.uk/all-reviews/eastern/suffolk/babergh",
+                "http://lgbce.org.uk/all-reviews/north-west",
+            ],
+            [r.url for r in requests],
+        )
+        # the frontier de-duplicates, so scrapy's dupefilter shouldn't
+        self.assertTrue(all(r.dont_filter for r in requests))
+
+    def test_checkpoint_every(self):
+        store = ArchiveStore()
+        store.CHECKPOINT_EVERY = 2
+        store.add("http://foo/1")
+        store.add("http://foo/2")
+        store.visit("http://foo/1")
+        self.assertEqual([], ArchiveStore().get_pending())
+        store.visit("http://foo/2")
+        self.assertEqual(
+            [
+                {"url": "http://foo/1", "visited": 1},
+                {"url": "http://foo/2", "visited": 1},
+            ],
+            scraperwiki.sql.select("* FROM lgbce_archive_frontier ORDER BY url"),
+        )
+
+    def test_draft(self):
+        spider = self.get_spider()
+        url = "http://www.lgbce.org.uk/all-reviews/eastern/suffolk/babergh"
+        spider.store.add(url)
+        rec = {"slug": "babergh", "latest_event": "foo", "eco": None}
+        with mock.patch(
+            "boundary_bot.archive.DetailPage.get_record",
+            return_value=(rec, "http://www.legislation.gov.uk/ukdsi/1"),
+        ):
+            requests = spider.parse(mock_response("fixtures/detail/no_eco.html", url))
+        self.assertEqual(
+            ["http://www.legislation.gov.uk/ukdsi/1"], [r.url for r in requests]
+        )
+        # the page isn't visited until we've got the made order
+        self.assertNotIn(url, spider.store.visited)
+
+        draft = TextResponse(
+            url=requests[0].url,
+            request=requests[0],
+            body=b'<a href="/uksi/2018/123/contents/made">made</a>',
+        )
+        self.assertEqual([], requests[0].callback(draft, **requests[0].cb_kwargs))
+        self.assertIn(url, spider.store.visited)
+        self.assertEqual(
+            "https://www.legislation.gov.uk/uksi/2018/123/contents/made",
+            spider.store.records[0]["eco"],
+        )
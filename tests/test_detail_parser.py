@@ -1,7 +1,10 @@
 import os
 import unittest
+from concurrent.futures import Future, ProcessPoolExecutor
+from unittest import mock
 from scrapy.http import TextResponse, Request
-from boundary_bot.spider import LgbceSpider
+from boundary_bot.detail_page import parse_page
+from boundary_bot.spider import LgbcePoolSpider, LgbceSpider
 
 
 def mock_response(file_name, url):
@@ -80,3 +83,141 @@ class DetailParserTest(unittest.TestCase):
         result = list(spider.parse(fixture))
         # response contains nothing we are looking for
         self.assertEqual(0, len(result))
+
+    def test_index_follows_reviews(self):
+        spider = LgbceSpider()
+        fixture = mock_response(
+            "fixtures/index/valid.html", "http://www.lgbce.org.uk/current-reviews"
+        )
+        result = list(spider.parse(fixture))
+        # the index page isn't a review, but we should follow each review link
+        self.assertEqual(
+            [
+                "http://www.lgbce.org.uk/all-reviews/eastern/suffolk/babergh",
+                "http://www.lgbce.org.uk/all-reviews/south-east/hampshire/basingstoke-and-deane",
+                "http://www.lgbce.org.uk/all-reviews/north-west/cumbria/allerdale",
+                "http://www.lgbce.org.uk/all-reviews/south-east/kent/ashford",
+            ],
+            [request.url for request in result],
+        )
+
+
+def parse_fixture(file_name, url):
+    dirname = os.path.dirname(os.path.abspath(__file__))
+    with open(os.path.join(dirname, file_name), "rb") as f:
+        return parse_page(url, f.read(), "utf-8")
+
+
+class ParsePageTest(unittest.TestCase):
+    def test_matches_spider(self):
+        # parsing the raw bytes in a worker process
+        # should give the same record as the spider
+        fixtures = [
+            (
+                "fixtures/detail/no_eco.html",
+                "http://www.lgbce.org.uk/current-reviews/eastern/suffolk/babergh",
+            ),
+            (
+                "fixtures/detail/with_eco_and_shapefiles.html",
+                "http://www.lgbce.org.uk/current-reviews/south-west/gloucestershire/tewkesbury",
+            ),
+            (
+                "fixtures/detail/made_eco.html",
+                "http://www.lgbce.org.uk/current-reviews/yorkshire-and-the-humber/west-yorkshire/leeds",
+            ),
+        ]
+        with ProcessPoolExecutor(2) as executor:
+            results = list(executor.map(parse_fixture, *zip(*fixtures)))
+
+        spider = LgbceSpider()
+        for (file_name, url), (rec, draft_link, follow_links) in zip(fixtures, results):
+            self.assertEqual(list(spider.parse(mock_response(file_name, url))), [rec])
+            self.assertIsNone(draft_link)
+            self.assertEqual([], follow_links)
+
+    def test_follow_links(self):
+        rec, draft_link, follow_links = parse_fixture(
+            "fixtures/index/valid.html", "http://www.lgbce.org.uk/current-reviews"
+        )
+        self.assertIsNone(rec)
+        self.assertEqual(4, len(follow_links))
+        self.assertEqual(
+            "http://www.lgbce.org.uk/all-reviews/eastern/suffolk/babergh",
+            follow_links[0],
+        )
+
+
+class PoolSpiderTest(unittest.TestCase):
+    def get_spider(self):
+        records = []
+        spider = LgbcePoolSpider(on_record=records.append)
+        spider.crawler = mock.Mock()
+        spider.pending = 1
+        return (spider, records)
+
+    def get_future(self, result):
+        future = Future()
+        future.set_result(result)
+        return future
+
+    def test_record(self):
+        spider, records = self.get_spider()
+        rec = {"slug": "babergh"}
+        spider.parsed("http://foo/babergh", self.get_future((rec, None, [])))
+        self.assertEqual([rec], records)
+        self.assertEqual(0, spider.pending)
+        spider.spider_idle(spider)  # doesn't raise DontCloseSpider
+
+    def test_follow_and_draft(self):
+        spider, records = self.get_spider()
+        rec = {"slug": "tewkesbury", "eco": None}
+        spider.parsed(
+            "http://foo/tewkesbury",
+            self.get_future((rec, "http://legislation/ukdsi/1", ["http://foo/bar"])),
+        )
+        # the record isn't finished until we've followed the draft link
+        self.assertEqual([], records)
+        requests = [c[0][0] for c in spider.crawler.engine.crawl.call_args_list]
+        self.assertEqual(
+            ["http://foo/bar", "http://legislation/ukdsi/1"],
+            [r.url for r in requests],
+        )
+
+        draft = TextResponse(
+            url=requests[1].url,
+            request=requests[1],
+            body=b'<a href="/uksi/2018/123/contents/made">made</a>',
+        )
+        requests[1].callback(draft, **requests[1].cb_kwargs)
+        self.assertEqual(
+            "https://www.legislation.gov.uk/uksi/2018/123/contents/made",
+            records[0]["eco"],
+        )
+
+
+class DraftRequestTest(unittest.TestCase):
+    def test_draft_request(self):
+        spider = LgbceSpider()
+        rec = {"slug": "tewkesbury", "eco": None}
+        request = spider.make_draft_request("http://legislation/ukdsi/1", rec)
+        # not on an allowed domain, but we still want it
+        self.assertTrue(request.dont_filter)
+
+        draft = TextResponse(
+            url=request.url,
+            request=request,
+            body=b'<a href="/uksi/2018/123/contents/made">made</a>',
+        )
+        result = list(request.callback(draft, **request.cb_kwargs))
+        self.assertEqual([rec], result)
+        self.assertEqual(
+            "https://www.legislation.gov.uk/uksi/2018/123/contents/made", rec["eco"]
+        )
+
+    def test_draft_failed(self):
+        spider = LgbceSpider()
+        rec = {"slug": "tewkesbury", "eco": None}
+        request = spider.make_draft_request("http://legislation/ukdsi/1", rec)
+        # we still get the record
+        self.assertEqual([rec], list(request.errback(mock.Mock(request=request))))
+        self.assertIsNone(rec["eco"])
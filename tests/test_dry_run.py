@@ -0,0 +1,116 @@
+import io
+import json
+import os
+import scraperwiki
+import shutil
+import tempfile
+from contextlib import redirect_stdout
+from unittest import mock, TestCase
+from boundary_bot.records import Review
+from boundary_bot.scraper import LgbceScraper
+from boundary_bot.snapshot import use_snapshot
+from data_provider import base_data
+
+
+def get_fixture(fixture):
+    dirname = os.path.dirname(os.path.abspath(__file__))
+    fixture_path = os.path.abspath(os.path.join(dirname, fixture))
+    return open(fixture_path).read()
+
+
+def mock_attach_spider_data(scraper):
+    def attach_spider_data(start_urls=None):
+        for record in scraper.data.values():
+            record["latest_event"] = "Consultation on draft recommendations"
+        scraper.data["babergh"]["latest_event"] = "foo"
+
+    return attach_spider_data
+
+
+@mock.patch("boundary_bot.code_matcher.CodeMatcher.get_data", lambda x: [])
+@mock.patch(
+    "boundary_bot.code_matcher.CodeMatcher.get_register_code",
+    lambda x, name: (None, None),
+)
+class DryRunTests(TestCase):
+    def setUp(self):
+        scraperwiki.sqlite.execute("DROP TABLE IF EXISTS lgbce_reviews;")
+
+    def test_dry_run(self):
+        scraper = LgbceScraper(False, False)
+        scraper.data = {
+            slug: Review(**base_data[slug])
+            for slug in ["allerdale", "ashford", "babergh"]
+        }
+        for record in scraper.data.values():
+            record["latest_event"] = "Consultation on draft recommendations"
+        scraper.data["foo"] = Review(**base_data["allerdale"])
+        scraper.data["foo"]["slug"] = "foo"
+        scraper.data["foo"]["latest_event"] = "bar"
+        scraper.save()
+        before = scraper.dump_table_to_json()
+
+        scraper = LgbceScraper(False, True)
+        scraper.dry_run = True
+        out = io.StringIO()
+        with mock.patch.object(
+            scraper,
+            "scrape_index",
+            return_value=get_fixture("fixtures/index/valid.html"),
+        ), mock.patch.object(
+            scraper, "attach_spider_data", side_effect=mock_attach_spider_data(scraper)
+        ), mock.patch.object(
+            scraper, "attach_shapefiles"
+        ) as attach_shapefiles, mock.patch.object(
+            scraper.slack_helper, "post_messages"
+        ) as post_messages, redirect_stdout(
+            out
+        ):
+            scraper.scrape()
+
+        changeset = json.loads(out.getvalue())
+        self.assertEqual(
+            ["basingstoke-and-deane"],
+            [record["slug"] for record in changeset["inserted"]],
+        )
+        self.assertEqual(
+            [
+                {
+                    "slug": "babergh",
+                    "changes": {
+                        "latest_event": ["Consultation on draft recommendations", "foo"]
+                    },
+                }
+            ],
+            changeset["updated"],
+        )
+        self.assertEqual(["foo"], changeset["deleted"])
+        self.assertEqual(2, len(changeset["slack_messages"]))
+        self.assertEqual([], changeset["github_issues"])
+
+        # nothing was written or sent
+        self.assertEqual(before, scraper.dump_table_to_json())
+        attach_shapefiles.assert_not_called()
+        post_messages.assert_not_called()
+
+
+class SnapshotTests(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.db_name = os.environ["SCRAPERWIKI_DATABASE_NAME"]
+
+    def tearDown(self):
+        os.environ["SCRAPERWIKI_DATABASE_NAME"] = self.db_name
+        shutil.rmtree(self.dir)
+
+    def test_use_snapshot(self):
+        path = os.path.join(self.dir, "data.sqlite")
+        with open(path, "wb") as f:
+            f.write(b"data")
+        os.environ["SCRAPERWIKI_DATABASE_NAME"] = "sqlite:///" + path
+
+        copy = use_snapshot()
+        self.assertNotEqual(path, copy)
+        self.assertEqual("sqlite:///" + copy, os.environ["SCRAPERWIKI_DATABASE_NAME"])
+        with open(copy, "rb") as f:
+            self.assertEqual(b"data", f.read())
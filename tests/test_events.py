@@ -0,0 +1,191 @@
+import os
+import requests
+import scraperwiki
+from unittest import mock, TestCase
+from boundary_bot import events
+from boundary_bot.events import EventStore
+from boundary_bot.records import Review
+from boundary_bot.scraper import LgbceScraper
+from data_provider import base_data
+
+
+class MockResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(str(self.status_code))
+
+
+def get_fixture(fixture):
+    dirname = os.path.dirname(os.path.abspath(__file__))
+    with open(os.path.join(dirname, fixture)) as f:
+        return f.read()
+
+
+def make_events(slugs):
+    return [
+        events.make_event(events.NEW_REVIEW, Review(**base_data[slug]), "2020-01-01")
+        for slug in slugs
+    ]
+
+
+def drop_tables():
+    for table in [
+        "lgbce_reviews",
+        "lgbce_change_events",
+        "lgbce_webhooks",
+    ]:
+        scraperwiki.sqlite.execute("DROP TABLE IF EXISTS %s;" % table)
+
+
+@mock.patch("boundary_bot.code_matcher.CodeMatcher.get_data", lambda x: [])
+class MakeEventsTests(TestCase):
+    def setUp(self):
+        scraperwiki.sqlite.execute("DROP TABLE IF EXISTS lgbce_reviews;")
+        scraperwiki.sqlite.execute("DROP TABLE IF EXISTS lgbce_change_events;")
+
+    def test_events(self):
+        scraper = LgbceScraper(False, False)
+        scraper.data = {
+            "allerdale": Review(**base_data["allerdale"]),
+            "babergh": Review(**base_data["babergh"]),
+        }
+        scraper.data["allerdale"]["status"] = scraper.CURRENT_LABEL
+        scraper.data["allerdale"]["latest_event"] = "foo"
+        scraper.data["babergh"]["latest_event"] = "foo"
+        scraper.save()
+
+        scraper.data["allerdale"]["status"] = scraper.COMPLETED_LABEL
+        scraper.data["babergh"]["latest_event"] = "The Babergh Electoral Change Order"
+        scraper.data["babergh"]["eco_made"] = 1
+        scraper.data["basingstoke-and-deane"] = Review(
+            **base_data["basingstoke-and-deane"]
+        )
+        scraper.make_notifications()
+        self.assertEqual(
+            [
+                ("allerdale", events.COMPLETED),
+                ("babergh", events.EVENT_CHANGED),
+                ("babergh", events.ECO_MADE),
+                ("basingstoke-and-deane", events.NEW_REVIEW),
+            ],
+            [(event["slug"], event["type"]) for event in scraper.events],
+        )
+        self.assertEqual(1, scraper.events[2]["review"]["eco_made"])
+
+        # Slack and GitHub get messages for the events they're interested in
+        self.assertEqual(3, len(scraper.slack_helper.messages))
+        self.assertEqual(1, len(scraper.github_helper.issues))
+
+        # events are saved along with the reviews
+        scraper.save()
+        store = EventStore()
+        self.assertEqual(
+            ["completed", "event_changed", "eco_made", "new_review"],
+            [event["type"] for event in store.get_since(0)],
+        )
+
+
+@mock.patch("boundary_bot.code_matcher.CodeMatcher.get_data", lambda x: [])
+class ScraperEventsTests(TestCase):
+    def setUp(self):
+        drop_tables()
+        scraperwiki.sqlite.execute("DROP TABLE IF EXISTS lgbce_review_checks;")
+
+    def test_bootstrap(self):
+        scraper = LgbceScraper(True, False)
+        scraper.data = {"babergh": Review(**base_data["babergh"])}
+        scraper.make_notifications()
+        self.assertEqual([events.NEW_REVIEW], [e["type"] for e in scraper.events])
+        scraper.save()
+        # nothing to send to webhooks later
+        self.assertEqual([], EventStore().get_since(0))
+
+    def test_save_fails(self):
+        scraper = LgbceScraper(False, False)
+        scraper.data = {"babergh": Review(**base_data["babergh"])}
+        scraper.make_notifications()
+        with mock.patch.object(
+            scraper.search_index, "index_reviews", side_effect=Exception("FTS error")
+        ):
+            with self.assertRaises(Exception):
+                scraper.save()
+        # the events are already stored, so they aren't lost
+        self.assertEqual(
+            [events.NEW_REVIEW], [e["type"] for e in EventStore().get_since(0)]
+        )
+
+    def test_deliver_when_index_unchanged(self):
+        # events which failed to deliver on a previous run
+        store = EventStore()
+        store.add_webhook("http://example.com/hook", 0)
+        store.append(make_events(["allerdale", "ashford"]))
+
+        scraper = LgbceScraper(False, True)
+        with mock.patch.object(
+            scraper,
+            "scrape_index",
+            return_value=get_fixture("fixtures/index/valid.html"),
+        ), mock.patch.object(
+            scraper, "is_index_unchanged", return_value=True
+        ), mock.patch.object(
+            scraper, "get_due_reviews", return_value=[]
+        ), mock.patch.object(
+            scraper, "attach_spider_data"
+        ) as attach_spider_data, mock.patch(
+            "boundary_bot.events.requests.post", return_value=MockResponse(200)
+        ) as post:
+            scraper.scrape()
+        attach_spider_data.assert_not_called()
+        self.assertEqual(2, post.call_count)
+        self.assertEqual(2, store.get_webhooks()[0]["cursor"])
+
+
+class EventStoreTests(TestCase):
+    def setUp(self):
+        drop_tables()
+        self.store = EventStore()
+
+    def test_get_since(self):
+        self.store.append(make_events(["allerdale", "ashford", "babergh"]))
+        result = self.store.get_since(1)
+        self.assertEqual([2, 3], [event["id"] for event in result])
+        self.assertEqual("Ashford", result[0]["review"]["name"])
+        self.assertEqual(3, self.store.get_latest_id())
+
+    def test_deliver(self):
+        self.store.append(make_events(["allerdale"]))
+        # new webhooks only get new events
+        self.store.add_webhook("http://example.com/hook")
+        self.store.append(make_events(["ashford", "babergh"]))
+
+        with mock.patch(
+            "boundary_bot.events.requests.post",
+            side_effect=[MockResponse(200), MockResponse(500)],
+        ) as post:
+            self.store.deliver()
+        self.assertEqual(
+            ["ashford", "babergh"], [c[1]["json"]["slug"] for c in post.call_args_list]
+        )
+        self.assertEqual(2, self.store.get_webhooks()[0]["cursor"])
+
+        # babergh failed, so we try it again next time
+        with mock.patch(
+            "boundary_bot.events.requests.post", return_value=MockResponse(200)
+        ) as post:
+            self.store.deliver()
+        self.assertEqual(
+            ["babergh"], [c[1]["json"]["slug"] for c in post.call_args_list]
+        )
+        self.assertEqual(3, self.store.get_webhooks()[0]["cursor"])
+
+    def test_replay(self):
+        self.store.append(make_events(["allerdale", "ashford"]))
+        self.store.add_webhook("http://example.com/hook", 0)
+        with mock.patch(
+            "boundary_bot.events.requests.post", return_value=MockResponse(200)
+        ) as post:
+            self.store.deliver()
+        self.assertEqual(2, post.call_count)
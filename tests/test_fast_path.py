@@ -0,0 +1,116 @@
+import datetime
+import os
+import scraperwiki
+from unittest import mock, TestCase
+from boundary_bot.records import Review
+from boundary_bot.scraper import LgbceScraper
+from data_provider import base_data
+
+
+NOW = datetime.datetime(2020, 6, 1, 12, 0, 0)
+
+
+def get_fixture(fixture):
+    dirname = os.path.dirname(os.path.abspath(__file__))
+    fixture_path = os.path.abspath(os.path.join(dirname, fixture))
+    return open(fixture_path).read()
+
+
+@mock.patch("boundary_bot.code_matcher.CodeMatcher.get_data", lambda x: [])
+@mock.patch("boundary_bot.scraper.LgbceScraper.get_now", lambda x: NOW)
+class FastPathTests(TestCase):
+    def setUp(self):
+        scraperwiki.sqlite.execute("DROP TABLE IF EXISTS lgbce_reviews;")
+        scraperwiki.sqlite.execute("DROP TABLE IF EXISTS lgbce_review_checks;")
+
+    def make_scraper(self):
+        scraper = LgbceScraper(False, False)
+        scraper.parse_index(get_fixture("fixtures/index/valid.html"))
+        return scraper
+
+    def save_checks(self, checked_at):
+        scraper = self.make_scraper()
+        for rec in scraper.data.values():
+            rec["latest_event"] = "Consultation on draft recommendations"
+        scraper.data["babergh"]["latest_event"] = "Electoral Change Order"
+        scraper.save()
+        scraperwiki.sql.execute(
+            "UPDATE lgbce_review_checks SET checked_at=?", [checked_at.isoformat()]
+        )
+        scraperwiki.sql.commit_transactions()
+
+    def test_fingerprint(self):
+        scraper = self.make_scraper()
+        fingerprint = scraper.get_index_fingerprint()
+        self.assertEqual(fingerprint, self.make_scraper().get_index_fingerprint())
+
+        # things we get from the detail pages don't change the fingerprint
+        scraper.data["babergh"]["latest_event"] = "foo"
+        self.assertEqual(fingerprint, scraper.get_index_fingerprint())
+
+        scraper.data["babergh"]["status"] = "Recent Reviews"
+        self.assertNotEqual(fingerprint, scraper.get_index_fingerprint())
+
+    def test_due_reviews(self):
+        self.save_checks(NOW - datetime.timedelta(days=2))
+        scraper = self.make_scraper()
+        # babergh is at the ECO stage so it is checked daily
+        # the others are checked less often
+        self.assertEqual(["babergh"], scraper.get_due_reviews())
+
+    def test_new_reviews_are_due(self):
+        self.save_checks(NOW)
+        scraper = self.make_scraper()
+        scraper.data["foo"] = Review(**base_data["babergh"])
+        scraper.data["foo"]["slug"] = "foo"
+        self.assertEqual(["foo"], scraper.get_due_reviews())
+
+    def test_nothing_due(self):
+        self.save_checks(NOW)
+        scraper = self.make_scraper()
+        scraperwiki.sql.save_var(
+            scraper.FINGERPRINT_VAR, scraper.get_index_fingerprint()
+        )
+
+        scraper = LgbceScraper(False, False)
+        with mock.patch.object(
+            scraper,
+            "scrape_index",
+            return_value=get_fixture("fixtures/index/valid.html"),
+        ), mock.patch.object(scraper, "attach_spider_data") as attach_spider_data:
+            scraper.scrape()
+        attach_spider_data.assert_not_called()
+
+    def test_only_crawl_due_reviews(self):
+        self.save_checks(NOW - datetime.timedelta(days=2))
+        scraper = self.make_scraper()
+        scraperwiki.sql.save_var(
+            scraper.FINGERPRINT_VAR, scraper.get_index_fingerprint()
+        )
+
+        scraper = LgbceScraper(False, False)
+
+        def attach_spider_data(start_urls):
+            scraper.data["babergh"]["latest_event"] = "Electoral Change Order"
+
+        with mock.patch.object(
+            scraper,
+            "scrape_index",
+            return_value=get_fixture("fixtures/index/valid.html"),
+        ), mock.patch.object(
+            scraper, "attach_spider_data", side_effect=attach_spider_data
+        ) as attach_spider_data, mock.patch(
+            "boundary_bot.code_matcher.CodeMatcher.get_register_code",
+            return_value=(None, None),
+        ), mock.patch.object(
+            scraper, "sync_db_to_github"
+        ):
+            scraper.scrape()
+        attach_spider_data.assert_called_once_with([base_data["babergh"]["url"]])
+        self.assertEqual(
+            "Consultation on draft recommendations",
+            scraper.data["allerdale"]["latest_event"],
+        )
+        self.assertEqual(
+            {"allerdale", "ashford", "basingstoke-and-deane"}, scraper.stored
+        )
@@ -1,5 +1,6 @@
 import os
 from unittest import mock, TestCase
+from boundary_bot.records import Review
 from boundary_bot.scraper import LgbceScraper, ScraperException
 from data_provider import base_data
 
@@ -16,12 +17,8 @@ class IndexParserTests(TestCase):
         fixture = self.get_fixture("fixtures/index/valid.html")
         scraper.parse_index(fixture)
         self.assertEqual(4, len(scraper.data))
-        self.assertDictEqual(base_data["babergh"], scraper.data["babergh"])
-        self.assertDictEqual(
-            base_data["basingstoke-and-deane"], scraper.data["basingstoke-and-deane"]
-        )
-        self.assertDictEqual(base_data["allerdale"], scraper.data["allerdale"])
-        self.assertDictEqual(base_data["ashford"], scraper.data["ashford"])
+        for slug in ["babergh", "basingstoke-and-deane", "allerdale", "ashford"]:
+            self.assertEqual(Review(**base_data[slug]), scraper.data[slug])
 
     def test_parse_unexpected_heading(self):
         scraper = LgbceScraper(False, False)
@@ -1,5 +1,6 @@
 import scraperwiki
 from unittest import mock, TestCase
+from boundary_bot.records import Review
 from boundary_bot.scraper import LgbceScraper
 from data_provider import base_data
 
@@ -12,7 +13,7 @@ class NotificationTests(TestCase):
     def test_no_events(self):
         scraper = LgbceScraper(False, False)
         scraper.data = {
-            "babergh": base_data["babergh"].copy(),
+            "babergh": Review(**base_data["babergh"]),
         }
         scraper.data["babergh"]["latest_event"] = "foo"
         scraper.save()
@@ -23,7 +24,7 @@ class NotificationTests(TestCase):
     def test_new_record(self):
         scraper = LgbceScraper(False, False)
         scraper.data = {
-            "babergh": base_data["babergh"].copy(),
+            "babergh": Review(**base_data["babergh"]),
         }
         scraper.data["babergh"]["latest_event"] = "foo"
         scraper.make_notifications()
@@ -34,7 +35,7 @@ class NotificationTests(TestCase):
     def test_new_event(self):
         scraper = LgbceScraper(False, False)
         scraper.data = {
-            "babergh": base_data["babergh"].copy(),
+            "babergh": Review(**base_data["babergh"]),
         }
         scraper.data["babergh"]["latest_event"] = "foo"
         scraper.save()
@@ -50,7 +51,7 @@ class NotificationTests(TestCase):
     def test_eco_made(self):
         scraper = LgbceScraper(False, False)
         scraper.data = {
-            "allerdale": base_data["allerdale"].copy(),
+            "allerdale": Review(**base_data["allerdale"]),
         }
         scraper.data["allerdale"][
             "latest_event"
@@ -0,0 +1,67 @@
+import scraperwiki
+from unittest import mock, TestCase
+from boundary_bot.records import Review
+from boundary_bot.scraper import LgbceScraper
+from data_provider import base_data
+
+
+class ReviewTests(TestCase):
+    def test_item_access(self):
+        review = Review(**base_data["babergh"])
+        self.assertEqual("Babergh", review["name"])
+        review["latest_event"] = "foo"
+        self.assertEqual("foo", review.latest_event)
+        with self.assertRaises(KeyError):
+            review["foo"]
+        with self.assertRaises(KeyError):
+            review["foo"] = "bar"
+        # no per-record __dict__
+        with self.assertRaises(AttributeError):
+            review.foo = "bar"
+
+    def test_equality(self):
+        self.assertEqual(Review(**base_data["babergh"]), Review(**base_data["babergh"]))
+        self.assertNotEqual(
+            Review(**base_data["babergh"]), Review(**base_data["allerdale"])
+        )
+        self.assertNotEqual(Review(**base_data["babergh"]), base_data["babergh"])
+
+    def test_as_dict(self):
+        self.assertEqual(base_data["babergh"], Review(**base_data["babergh"]).as_dict())
+
+    def test_diff(self):
+        review = Review(**base_data["babergh"])
+        self.assertEqual({}, review.diff(base_data["babergh"]))
+
+        review["latest_event"] = "foo"
+        self.assertEqual(
+            {"latest_event": (None, "foo")}, review.diff(base_data["babergh"])
+        )
+
+        self.assertEqual(len(Review.FIELDS), len(review.diff(None)))
+
+    def test_update(self):
+        review = Review(**base_data["babergh"])
+        review.update({"slug": "babergh", "latest_event": "foo", "unknown": "bar"})
+        self.assertEqual("foo", review["latest_event"])
+        self.assertEqual("Babergh", review["name"])
+
+
+@mock.patch("boundary_bot.code_matcher.CodeMatcher.get_data", lambda x: [])
+class SaveTests(TestCase):
+    def setUp(self):
+        scraperwiki.sqlite.execute("DROP TABLE IF EXISTS lgbce_reviews;")
+
+    def test_only_save_changes(self):
+        scraper = LgbceScraper(False, False)
+        scraper.data = {
+            "babergh": Review(**base_data["babergh"]),
+            "allerdale": Review(**base_data["allerdale"]),
+        }
+        scraper.save()
+
+        scraper.data["babergh"]["latest_event"] = "foo"
+        with mock.patch("boundary_bot.scraper.db.save") as save:
+            scraper.save()
+        saved = save.call_args_list[0][1]["data"]
+        self.assertEqual(["babergh"], [row["slug"] for row in saved])
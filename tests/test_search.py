@@ -0,0 +1,151 @@
+import scraperwiki
+from unittest import mock, TestCase
+from boundary_bot.archive import ArchiveStore
+from boundary_bot.code_matcher import CodeMatcher
+from boundary_bot.records import Review
+from boundary_bot.scraper import LgbceScraper
+from boundary_bot.search import SearchIndex, make_match_query
+from data_provider import base_data
+
+
+COUNCILS = [
+    {"la-name": "Basingstoke and Deane", "local-authority-code": "BAS"},
+    {"la-name": "Babergh", "local-authority-code": "BAB"},
+    {"la-name": "Ipswich", "local-authority-code": "IPS"},
+]
+
+
+def drop_tables():
+    for table in [
+        "lgbce_reviews",
+        "lgbce_review_changes",
+        "lgbce_change_events",
+        "lgbce_archive",
+        "lgbce_archive_frontier",
+        "lgbce_search",
+        "lgbce_search_keys",
+    ]:
+        scraperwiki.sqlite.execute("DROP TABLE IF EXISTS %s;" % table)
+
+
+class MakeMatchQueryTests(TestCase):
+    def test_make_match_query(self):
+        self.assertEqual(
+            '"electoral" "changes"*', make_match_query("Electoral Changes")
+        )
+        # FTS syntax is just text
+        self.assertEqual('"foo" "or" "bar"*', make_match_query('foo OR "bar'))
+        self.assertIsNone(make_match_query("()"))
+
+
+@mock.patch("boundary_bot.code_matcher.CodeMatcher.get_data", lambda x: COUNCILS)
+class SearchIndexTests(TestCase):
+    def setUp(self):
+        drop_tables()
+        self.scraper = LgbceScraper(False, False)
+        self.scraper.data = {
+            slug: Review(**base_data[slug])
+            for slug in ["allerdale", "ashford", "babergh"]
+        }
+        self.scraper.data["allerdale"][
+            "latest_event"
+        ] = "The Allerdale (Electoral Changes) Order 2023"
+        self.scraper.data["ashford"]["latest_event"] = "Final recommendations"
+        self.scraper.data["babergh"]["latest_event"] = "Draft recommendations"
+        # a review which isn't named after its council
+        self.scraper.data["ashford"]["register_code"] = "IPS"
+        self.scraper.make_notifications()
+        self.scraper.save()
+        self.index = self.scraper.search_index
+
+    def get_slugs(self, text):
+        return [result["slug"] for result in self.index.search(text)]
+
+    def test_search(self):
+        results = self.index.search("electoral changes order 2023")
+        self.assertEqual(["allerdale"], [result["slug"] for result in results])
+        self.assertEqual("review", results[0]["source"])
+        self.assertIn("[2023]", results[0]["snippet"])
+
+        # one result for each review
+        self.assertEqual(["ashford", "babergh"], sorted(self.get_slugs("recommend")))
+        # prefixes and names
+        self.assertEqual(["ashford"], self.get_slugs("ashf"))
+
+    def test_updates(self):
+        self.scraper.data["babergh"]["latest_event"] = "Consultation"
+        self.scraper.make_notifications()
+        self.scraper.save()
+        self.assertEqual(["babergh"], self.get_slugs("consultation"))
+        # the old event is still in the event history
+        results = self.index.search("draft recommendations")
+        self.assertEqual(["babergh"], [result["slug"] for result in results])
+        self.assertEqual("event", results[0]["source"])
+
+        # deleted reviews only turn up in their history
+        del self.scraper.data["ashford"]
+        self.scraper.cleanup()
+        self.assertEqual(["event"], [r["source"] for r in self.index.search("final")])
+        # every document is still in the keys table, and nothing else is
+        self.assertEqual(
+            scraperwiki.sql.select(
+                "key, rowid AS docid FROM lgbce_search ORDER BY key"
+            ),
+            scraperwiki.sql.select("key, docid FROM lgbce_search_keys ORDER BY key"),
+        )
+
+    def test_archive(self):
+        store = ArchiveStore()
+        store.visit(
+            "https://www.lgbce.org.uk/all-reviews/derby",
+            {
+                "url": "https://www.lgbce.org.uk/all-reviews/derby",
+                "slug": "derby",
+                "name": "Derby",
+                "latest_event": "The Derby (Electoral Changes) Order 2001",
+            },
+        )
+        store.checkpoint()
+        self.assertEqual(["allerdale", "derby"], sorted(self.get_slugs("electoral")))
+
+    def test_fuzzy(self):
+        # nothing matches the text, so we match names
+        results = self.index.search("Alerdale")
+        self.assertEqual(["allerdale"], [result["slug"] for result in results])
+        self.assertEqual("name", results[0]["source"])
+
+        # or official council names
+        results = self.index.search("Ipswitch")
+        self.assertEqual(["ashford"], [result["slug"] for result in results])
+        self.assertEqual("council", results[0]["source"])
+
+        self.assertEqual([], self.index.search("zzzzzz"))
+
+    def test_council_matches(self):
+        councils = [
+            {"la-name": "Council %i" % i, "local-authority-code": "C%i" % i}
+            for i in range(50)
+        ]
+        with mock.patch(
+            "boundary_bot.code_matcher.CodeMatcher.get_data",
+            lambda x: councils + COUNCILS,
+        ):
+            matches = CodeMatcher().get_matches("Basingstok", limit=2)
+        self.assertEqual(
+            ["Basingstoke and Deane", "Babergh"], [match[1] for match in matches]
+        )
+
+    def test_rebuild(self):
+        scraperwiki.sqlite.execute("DROP TABLE lgbce_search;")
+        # the index is built from what we've already got
+        index = SearchIndex()
+        self.assertEqual(["allerdale"], [r["slug"] for r in index.search("2023")])
+        self.assertEqual(
+            ["event", "review"],
+            sorted(
+                row["source"]
+                for row in scraperwiki.sql.select(
+                    "source FROM lgbce_search WHERE slug='allerdale'"
+                )
+            ),
+        )
@@ -0,0 +1,112 @@
+import hashlib
+import os
+import scraperwiki
+import shutil
+import tempfile
+from unittest import mock, TestCase
+from boundary_bot import throttle
+from boundary_bot.records import Review
+from boundary_bot.scraper import LgbceScraper
+from boundary_bot.shapefiles import ShapefileStore
+from data_provider import base_data
+
+
+URL = "http://www.lgbce.org.uk/__data/assets/file/derpderp.zip"
+
+
+class MockResponse:
+    def __init__(self, status_code, content=b"", headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+
+    def iter_content(self, chunk_size=1):
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i : i + chunk_size]
+
+    def raise_for_status(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class ShapefileStoreTests(TestCase):
+    def setUp(self):
+        scraperwiki.sqlite.execute("DROP TABLE IF EXISTS lgbce_shapefiles;")
+        throttle.THROTTLES.clear()
+        self.root = tempfile.mkdtemp()
+        self.store = ShapefileStore(self.root)
+        # use a tiny chunk size so we exercise the streaming
+        self.store.CHUNK_SIZE = 3
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def fetch(self, response):
+        with mock.patch(
+            "boundary_bot.throttle.requests.get", return_value=response
+        ) as get, mock.patch("boundary_bot.throttle.time.sleep"):
+            result = self.store.fetch(URL)
+        self.assertEqual(ShapefileStore.TIMEOUT, get.call_args[1]["timeout"])
+        return (result, get.call_args[1]["headers"])
+
+    def test_new(self):
+        (row, status), headers = self.fetch(
+            MockResponse(200, b"zipzipzip", {"ETag": '"abc"'})
+        )
+        sha256 = hashlib.sha256(b"zipzipzip").hexdigest()
+        self.assertEqual(ShapefileStore.NEW, status)
+        self.assertEqual(sha256, row["sha256"])
+        self.assertEqual(9, row["size"])
+        self.assertEqual('"abc"', row["etag"])
+        self.assertNotIn("If-None-Match", headers)
+        with open(self.store.get_path(sha256), "rb") as f:
+            self.assertEqual(b"zipzipzip", f.read())
+        # only the finished file should be left behind
+        self.assertEqual([sha256[:2]], os.listdir(self.root))
+
+    def test_not_modified(self):
+        (row, status), headers = self.fetch(
+            MockResponse(200, b"zipzipzip", {"ETag": '"abc"'})
+        )
+        self.store.save(row)
+
+        (row, status), headers = self.fetch(MockResponse(304))
+        self.assertEqual(ShapefileStore.UNCHANGED, status)
+        self.assertEqual('"abc"', headers["If-None-Match"])
+        self.assertEqual(hashlib.sha256(b"zipzipzip").hexdigest(), row["sha256"])
+
+    def test_changed(self):
+        (row, status), headers = self.fetch(
+            MockResponse(200, b"zipzipzip", {"ETag": '"abc"'})
+        )
+        self.store.save(row)
+
+        (row, status), headers = self.fetch(
+            MockResponse(200, b"newzip", {"ETag": '"def"'})
+        )
+        self.assertEqual(ShapefileStore.CHANGED, status)
+        self.assertEqual(hashlib.sha256(b"newzip").hexdigest(), row["sha256"])
+        self.assertEqual('"def"', row["etag"])
+
+
+@mock.patch("boundary_bot.code_matcher.CodeMatcher.get_data", lambda x: [])
+class ShapefileNotificationTests(TestCase):
+    def setUp(self):
+        scraperwiki.sqlite.execute("DROP TABLE IF EXISTS lgbce_reviews;")
+
+    def test_shapefile_changed(self):
+        scraper = LgbceScraper(False, False)
+        scraper.data = {
+            "babergh": Review(**base_data["babergh"]),
+        }
+        scraper.data["babergh"]["latest_event"] = "foo"
+        scraper.data["babergh"]["shapefiles"] = URL
+        scraper.save()
+        scraper.shapefile_data = {
+            "babergh": ({"url": URL}, ShapefileStore.CHANGED),
+        }
+        scraper.make_notifications()
+        self.assertEqual(1, len(scraper.slack_helper.messages))
+        assert "Shapefiles for Babergh" in scraper.slack_helper.messages[0]
@@ -0,0 +1,210 @@
+import json
+import os
+import scraperwiki
+import shutil
+import tempfile
+import threading
+from http.server import HTTPServer, SimpleHTTPRequestHandler
+from unittest import mock, TestCase
+from boundary_bot.sharding import (
+    ShardException,
+    get_index_urls,
+    get_shard_urls,
+    merge_partials,
+    run_local_shards,
+    shard_for,
+)
+
+
+FIXTURE_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "fixtures", "detail"
+)
+# review pages for the local crawl, by slug
+FIXTURES = {
+    "babergh": "no_eco.html",
+    "tewkesbury": "with_eco_and_shapefiles.html",
+    "allerdale": "no_matches.html",
+}
+SLUGS = ["allerdale", "ashford", "babergh", "basingstoke-and-deane", "tewkesbury"]
+URLS = ["http://www.lgbce.org.uk/all-reviews/" + slug for slug in SLUGS]
+
+
+class FixtureHandler(SimpleHTTPRequestHandler):
+    def translate_path(self, path):
+        return os.path.join(FIXTURE_DIR, FIXTURES[os.path.basename(path)])
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ShardTests(TestCase):
+    def test_shard_for(self):
+        # shards must be the same in every process
+        self.assertEqual(shard_for("babergh", 4), shard_for("babergh", 4))
+        self.assertEqual(0, shard_for("babergh", 2))
+        self.assertEqual(1, shard_for("tewkesbury", 2))
+        self.assertEqual(0, shard_for("babergh", 1))
+        for slug in SLUGS:
+            self.assertIn(shard_for(slug, 3), range(3))
+
+
+class IndexTests(TestCase):
+    def test_get_index_urls(self):
+        scraperwiki.sqlite.execute("DROP TABLE IF EXISTS lgbce_reviews;")
+        with open(os.path.join(FIXTURE_DIR, "..", "index", "valid.html")) as f:
+            html = f.read()
+        with mock.patch(
+            "boundary_bot.scraper.LgbceScraper.scrape_index", return_value=html
+        ):
+            urls = get_index_urls()
+        self.assertEqual(4, len(urls))
+        # a worker doesn't set up the scraper's tables
+        self.assertEqual(
+            [],
+            scraperwiki.sql.select(
+                "name FROM sqlite_master WHERE name='lgbce_reviews'"
+            ),
+        )
+
+
+class MergeTests(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write_partials(self, shards, partials, urls=URLS):
+        paths = []
+        for shard, slugs in partials:
+            path = os.path.join(self.dir, "shard-%i-%i.json" % (shard, len(paths)))
+            with open(path, "w") as f:
+                json.dump(
+                    {
+                        "shard": shard,
+                        "shards": shards,
+                        "urls": get_shard_urls(urls, shard, shards),
+                        "records": [{"slug": slug} for slug in slugs],
+                    },
+                    f,
+                )
+            paths.append(path)
+        return paths
+
+    def get_shards(self, shards):
+        return [
+            (shard, [slug for slug in SLUGS if shard_for(slug, shards) == shard])
+            for shard in range(shards)
+        ]
+
+    def test_merge(self):
+        # whatever order the partials are in, the result is the same
+        paths = self.write_partials(2, reversed(self.get_shards(2)))
+        records = merge_partials(paths, URLS)
+        self.assertEqual(SLUGS, [record["slug"] for record in records])
+
+    def test_missing_shard(self):
+        paths = self.write_partials(3, self.get_shards(3)[:2])
+        with self.assertRaises(ShardException) as e:
+            merge_partials(paths)
+        self.assertEqual("Missing shards: [2]", str(e.exception))
+
+    def test_duplicate_shard(self):
+        shards = self.get_shards(2)
+        paths = self.write_partials(2, shards + shards[:1])
+        with self.assertRaises(ShardException) as e:
+            merge_partials(paths)
+        self.assertEqual("Duplicate shards: [0]", str(e.exception))
+
+    def test_wrong_shard(self):
+        shards = self.get_shards(2)
+        shards[0][1].append(shards[1][1][0])
+        paths = self.write_partials(2, shards)
+        with self.assertRaises(ShardException) as e:
+            merge_partials(paths)
+        assert "expected shard 1" in str(e.exception)
+
+    def test_unexpected_slug(self):
+        # e.g: a page which redirected to another review
+        paths = self.write_partials(2, self.get_shards(2), URLS[1:])
+        with self.assertRaises(ShardException) as e:
+            merge_partials(paths, URLS[1:])
+        assert "Unexpected slug: Found 'allerdale'" in str(e.exception)
+
+    def test_wrong_urls(self):
+        # the workers saw a version of the reviews page without ashford
+        paths = self.write_partials(2, self.get_shards(2), URLS[:1] + URLS[2:])
+        with self.assertRaises(ShardException) as e:
+            merge_partials(paths, URLS)
+        self.assertEqual(
+            "Shard %i crawled the wrong pages: missing ['%s'], unexpected []"
+            % (shard_for("ashford", 2), URLS[1]),
+            str(e.exception),
+        )
+
+    def test_missing_record(self):
+        shards = self.get_shards(2)
+        for shard, slugs in shards:
+            if "ashford" in slugs:
+                slugs.remove("ashford")
+        paths = self.write_partials(2, shards)
+        with self.assertLogs("boundary_bot.sharding", "WARNING") as logs:
+            records = merge_partials(paths, URLS)
+        self.assertNotIn("ashford", [record["slug"] for record in records])
+        self.assertIn("No record found for: ashford", logs.output[0])
+
+
+class LocalShardTests(TestCase):
+    def setUp(self):
+        self.server = HTTPServer(("127.0.0.1", 0), FixtureHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+    def test_run_local_shards(self):
+        base_url = "http://127.0.0.1:%i/" % self.server.server_port
+        # babergh is in shard 0, the others are in shard 1
+        urls = [base_url + slug for slug in sorted(FIXTURES)]
+        records = run_local_shards(urls, 2)
+        # allerdale isn't a review page
+        self.assertEqual(
+            ["babergh", "tewkesbury"], [record["slug"] for record in records]
+        )
+        self.assertEqual(
+            "Consultation on draft recommendations",
+            records[0]["latest_event"],
+        )
+
+    def test_settings(self):
+        # the workers crawl with our settings
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        base_url = "http://127.0.0.1:%i/" % self.server.server_port
+        settings = {
+            "HTTPCACHE_ENABLED": True,
+            "HTTPCACHE_DIR": cache_dir,
+            "HTTPCACHE_EXPIRATION_SECS": 0,
+        }
+        records = run_local_shards([base_url + "babergh"], 2, settings, 0)
+        self.assertEqual(["babergh"], [record["slug"] for record in records])
+        self.assertEqual(["reviews"], os.listdir(cache_dir))
+
+    def test_failed_shard(self):
+        # shard 0 fails straight away while shard 1 is still crawling
+        failed = mock.Mock(**{"poll.return_value": 1})
+        running = mock.Mock(**{"poll.return_value": None})
+        with mock.patch(
+            "boundary_bot.sharding.subprocess.Popen", side_effect=[failed, running]
+        ) as popen:
+            with self.assertRaises(ShardException):
+                run_local_shards(URLS, 2)
+        running.kill.assert_called_once_with()
+        failed.kill.assert_not_called()
+        # the work directory is cleaned up too
+        args = popen.call_args[0][0]
+        workdir = os.path.dirname(args[args.index("--output") + 1])
+        self.assertFalse(os.path.exists(workdir))
@@ -1,4 +1,5 @@
 from unittest import mock, TestCase
+from boundary_bot.records import Review
 from boundary_bot.scraper import LgbceScraper, ScraperException
 from data_provider import base_data
 
@@ -28,8 +29,8 @@ class AttachSpiderTests(TestCase):
     def test_valid(self):
         scraper = LgbceScraper(False, False)
         scraper.data = {
-            "babergh": base_data["babergh"].copy(),
-            "basingstoke-and-deane": base_data["basingstoke-and-deane"].copy(),
+            "babergh": Review(**base_data["babergh"]),
+            "basingstoke-and-deane": Review(**base_data["basingstoke-and-deane"]),
         }
         scraper.attach_spider_data()
         self.assertEqual(
@@ -56,7 +57,7 @@ class AttachSpiderTests(TestCase):
     def test_unexpected(self):
         scraper = LgbceScraper(False, False)
         scraper.data = {
-            "babergh": base_data["babergh"].copy(),
+            "babergh": Review(**base_data["babergh"]),
         }
         with self.assertRaises(ScraperException):
             scraper.attach_spider_data()
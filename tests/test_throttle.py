@@ -0,0 +1,102 @@
+from unittest import mock, TestCase
+from scrapy import Request
+from scrapy.http import Response
+from boundary_bot import throttle
+from boundary_bot.throttle import AdaptiveThrottleMiddleware, DomainThrottle
+
+
+class MockResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class DomainThrottleTests(TestCase):
+    def get_throttle(self):
+        return DomainThrottle(
+            "www.lgbce.org.uk", max_concurrency=4, min_delay=0.1, concurrency=2
+        )
+
+    def test_back_off(self):
+        t = self.get_throttle()
+        self.assertTrue(t.record(0.1, 503))
+        self.assertEqual((1, 1.0), (t.concurrency, t.delay))
+        self.assertTrue(t.record(0.1, 429, retry_after=10))
+        self.assertEqual((1, 10.0), (t.concurrency, t.delay))
+        # failed requests back off too
+        self.assertTrue(t.record(0))
+        self.assertEqual((1, 20.0), (t.concurrency, t.delay))
+
+    def test_slow_down(self):
+        t = self.get_throttle()
+        self.assertTrue(t.record(2.0, 200))
+        self.assertEqual(1, t.concurrency)
+        self.assertAlmostEqual(0.15, t.delay)
+
+    def test_speed_up(self):
+        t = self.get_throttle()
+        t.record(2.0, 200)
+        t.record(2.0, 200)
+        self.assertEqual(1, t.concurrency)
+        # with a concurrency of 1, a round is one response
+        self.assertTrue(t.record(0.1, 200))
+        self.assertEqual(2, t.concurrency)
+        self.assertAlmostEqual(0.16875, t.delay)
+        # now it takes two
+        self.assertFalse(t.record(0.1, 200))
+        self.assertTrue(t.record(0.1, 200))
+        self.assertEqual(3, t.concurrency)
+
+    def test_limits(self):
+        t = self.get_throttle()
+        for i in range(100):
+            t.record(0.1, 200)
+        self.assertEqual((4, 0.1), (t.concurrency, t.delay))
+        # already as fast as we're allowed to go
+        self.assertFalse(t.record(0.1, 200))
+
+
+class ThrottledGetTests(TestCase):
+    def setUp(self):
+        throttle.THROTTLES.clear()
+
+    def test_get(self):
+        with mock.patch(
+            "boundary_bot.throttle.requests.get",
+            return_value=MockResponse(429, {"Retry-After": "5"}),
+        ), mock.patch("boundary_bot.throttle.time.sleep"):
+            throttle.get("https://www.legislation.gov.uk/ukdsi/2018/123")
+        t = throttle.THROTTLES["www.legislation.gov.uk"]
+        self.assertEqual((1, 5.0), (t.concurrency, t.delay))
+
+
+class ShareBudgetsTests(TestCase):
+    def tearDown(self):
+        throttle.share_budgets(1)
+
+    def test_share_budgets(self):
+        throttle.share_budgets(4)
+        t = throttle.get_throttle("www.lgbce.org.uk")
+        self.assertEqual((2, 0.4), (t.max_concurrency, t.min_delay))
+        # never less than one request at a time
+        t = throttle.get_throttle("www.legislation.gov.uk")
+        self.assertEqual((1, 4.0), (t.max_concurrency, t.min_delay))
+
+
+class MiddlewareTests(TestCase):
+    def setUp(self):
+        throttle.THROTTLES.clear()
+
+    def test_update_slot(self):
+        slot = mock.Mock(concurrency=5, delay=0.25)
+        crawler = mock.Mock()
+        crawler.engine.downloader.slots = {"www.lgbce.org.uk": slot}
+        middleware = AdaptiveThrottleMiddleware.from_crawler(crawler)
+
+        request = Request(
+            "http://www.lgbce.org.uk/all-reviews/babergh",
+            meta={"download_slot": "www.lgbce.org.uk", "download_latency": 0.1},
+        )
+        response = Response(request.url, status=503, request=request)
+        self.assertIs(response, middleware.process_response(request, response, None))
+        self.assertEqual((2, 1.0), (slot.concurrency, slot.delay))
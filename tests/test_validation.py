@@ -1,5 +1,6 @@
 import scraperwiki
 from unittest import mock, TestCase
+from boundary_bot.records import Review
 from boundary_bot.scraper import LgbceScraper, ScraperException
 from data_provider import base_data
 
@@ -12,7 +13,7 @@ class ValidationTests(TestCase):
     def test_valid(self):
         scraper = LgbceScraper(False, False)
         scraper.data = {
-            "babergh": base_data["babergh"].copy(),
+            "babergh": Review(**base_data["babergh"]),
         }
         scraper.data["babergh"]["latest_event"] = "foo"
         scraper.BOOTSTRAP_MODE = False
@@ -22,7 +23,7 @@ class ValidationTests(TestCase):
         # latest_event = None and we already have a non-empty latest_event in the DB
         scraper = LgbceScraper(False, False)
         scraper.data = {
-            "babergh": base_data["babergh"].copy(),
+            "babergh": Review(**base_data["babergh"]),
         }
         scraper.data["babergh"]["latest_event"] = "foo"
         scraper.save()
@@ -37,7 +38,7 @@ class ValidationTests(TestCase):
         # status = 'Recent Reviews' and record not in DB
         scraper = LgbceScraper(False, False)
         scraper.data = {
-            "allerdale": base_data["allerdale"].copy(),
+            "allerdale": Review(**base_data["allerdale"]),
         }
         scraper.data["allerdale"][
             "latest_event"
@@ -57,7 +58,7 @@ class ValidationTests(TestCase):
         # old status is 'Recent Reviews', new status is 'Current Reviews'
         scraper = LgbceScraper(False, False)
         scraper.data = {
-            "allerdale": base_data["allerdale"].copy(),
+            "allerdale": Review(**base_data["allerdale"]),
         }
         scraper.data["allerdale"][
             "latest_event"
@@ -82,7 +83,7 @@ class ValidationTests(TestCase):
         # old eco_made value is 1, new value is 0
         scraper = LgbceScraper(False, False)
         scraper.data = {
-            "allerdale": base_data["allerdale"].copy(),
+            "allerdale": Review(**base_data["allerdale"]),
         }
         scraper.data["allerdale"][
             "latest_event"
@@ -100,3 +101,57 @@ class ValidationTests(TestCase):
         # this check should be skipped in bootstrap mode
         scraper.BOOTSTRAP_MODE = True
         self.assertTrue(scraper.validate())
+
+    def test_all_violations_reported(self):
+        scraper = LgbceScraper(False, False)
+        scraper.data = {
+            "allerdale": Review(**base_data["allerdale"]),
+            "babergh": Review(**base_data["babergh"]),
+        }
+        scraper.data["allerdale"]["latest_event"] = "bar"
+        scraper.data["babergh"]["latest_event"] = "foo"
+        scraper.data["babergh"]["eco_made"] = 1
+        scraper.save()
+        scraper.data["babergh"]["latest_event"] = None
+        scraper.data["babergh"]["eco_made"] = 0
+        scraper.data["ashford"] = Review(**base_data["ashford"])
+
+        scraper.BOOTSTRAP_MODE = False
+        with self.assertRaises(ScraperException) as e:
+            scraper.validate()
+        messages = str(e.exception).split("\n\n")
+        self.assertEqual(3, len(messages))
+        assert messages[0].startswith("Failed to populate 'latest_event' field")
+        assert "slug='babergh'" in messages[0]
+        assert messages[1].startswith("'eco_made' field has changed from 1 to 0")
+        assert messages[2].startswith("New record found but status is 'Recent Reviews'")
+        assert "slug='ashford'" in messages[2]
+
+    def test_duplicate_slugs(self):
+        scraper = LgbceScraper(False, False)
+        scraper.data = {
+            "ashford": Review(**base_data["ashford"]),
+            "babergh": Review(**base_data["babergh"]),
+        }
+        # the spider found babergh twice
+        review_details = [
+            {"slug": "ashford", "latest_event": "foo"},
+            {"slug": "babergh", "latest_event": "foo"},
+            {"slug": "babergh", "latest_event": "bar"},
+        ]
+        with mock.patch.object(
+            scraper, "get_review_details", return_value=review_details
+        ):
+            scraper.attach_spider_data()
+        self.assertEqual(2, len(scraper.data))
+
+        scraper.BOOTSTRAP_MODE = False
+        with self.assertRaises(ScraperException) as e:
+            scraper.validate()
+        messages = str(e.exception).split("\n\n")
+        self.assertEqual(
+            "Human sacrifice, dogs and cats living together, mass hysteria!",
+            messages[-1],
+        )
+        # only babergh was duplicated
+        self.assertEqual(1, str(e.exception).count("Human sacrifice"))
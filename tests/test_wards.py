@@ -0,0 +1,138 @@
+import os
+import scraperwiki
+import shutil
+import struct
+import tempfile
+import zipfile
+from unittest import TestCase
+from boundary_bot.wards import WardStore, read_wards
+
+
+def make_shp(shapes):
+    # shapes is a list of lists of rings, or None for a null shape
+    records = b""
+    for i, rings in enumerate(shapes):
+        if rings is None:
+            content = struct.pack("<i", 0)
+        else:
+            points = [p for ring in rings for p in ring]
+            parts = []
+            for ring in rings:
+                parts.append(sum(len(r) for r in rings[: len(parts)]))
+            content = struct.pack("<i4d", 5, 0, 0, 0, 0)
+            content += struct.pack("<ii", len(parts), len(points))
+            content += struct.pack("<%ii" % len(parts), *parts)
+            for x, y in points:
+                content += struct.pack("<2d", x, y)
+        records += struct.pack(">ii", i + 1, len(content) // 2) + content
+    header = struct.pack(">i", 9994) + b"\x00" * 20
+    header += struct.pack(">i", (100 + len(records)) // 2)
+    header += struct.pack("<ii", 1000, 5) + b"\x00" * 64
+    return header + records
+
+
+def make_dbf(fields, rows, deleted=()):
+    record_length = 1 + sum(length for _, length in fields)
+    header_length = 32 + 32 * len(fields) + 1
+    dbf = struct.pack("<B3BIHH", 3, 0, 0, 0, len(rows), header_length, record_length)
+    dbf += b"\x00" * 20
+    for name, length in fields:
+        dbf += name.encode("ascii").ljust(11, b"\x00") + b"C" + b"\x00" * 4
+        dbf += bytes([length]) + b"\x00" * 15
+    dbf += b"\x0d"
+    for i, row in enumerate(rows):
+        dbf += b"*" if i in deleted else b" "
+        for (name, length), value in zip(fields, row):
+            dbf += value.encode("utf-8").ljust(length)
+    return dbf + b"\x1a"
+
+
+# clockwise outer rings (as the shapefile spec requires)
+SQUARE = [(0, 0), (0, 10), (10, 10), (10, 0), (0, 0)]
+HOLE = [(2, 2), (4, 2), (4, 4), (2, 4), (2, 2)]
+RECTANGLE = [(20, 5), (20, 8), (30, 8), (30, 5), (20, 5)]
+
+
+class ReadWardsTests(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "final.zip")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def make_zip(self, files):
+        with zipfile.ZipFile(self.path, "w", zipfile.ZIP_DEFLATED) as zf:
+            for name, content in files.items():
+                zf.writestr(name, content)
+
+    def test_read_wards(self):
+        self.make_zip(
+            {
+                "Final/Tewkesbury_wards.shp": make_shp(
+                    [[SQUARE, HOLE], None, [RECTANGLE]]
+                ),
+                "Final/Tewkesbury_wards.dbf": make_dbf(
+                    [("ID", 4), ("WARD_NAME", 20)],
+                    [("1", "Brockworth"), ("2", "Cleeve Hill"), ("3", "Winchcombe")],
+                ),
+                "Final/Tewkesbury_parishes.shp": make_shp([[RECTANGLE]]),
+            }
+        )
+        wards = read_wards(self.path)
+        self.assertEqual(["Brockworth", "Cleeve Hill", "Winchcombe"], wards.names)
+        self.assertEqual([96.0, 0.0, 30.0], wards.areas.tolist())
+        self.assertEqual([0, 0, 10, 10], wards.bboxes[0].tolist())
+        self.assertEqual([20, 5, 30, 8], wards.bboxes[2].tolist())
+        self.assertEqual((0, 0, 30, 10), wards.get_bbox())
+
+    def test_deleted_records(self):
+        self.make_zip(
+            {
+                "wards.shp": make_shp([[SQUARE], [SQUARE, HOLE], [RECTANGLE]]),
+                "wards.dbf": make_dbf(
+                    [("NAME", 10)], [("A",), ("B",), ("C",)], deleted=[1]
+                ),
+            }
+        )
+        wards = read_wards(self.path)
+        self.assertEqual(["A", "C"], wards.names)
+        self.assertEqual([100.0, 30.0], wards.areas.tolist())
+        self.assertEqual([20, 5, 30, 8], wards.bboxes[1].tolist())
+
+    def test_no_shapefile(self):
+        self.make_zip({"readme.txt": "nothing to see here"})
+        with self.assertRaises(ValueError):
+            read_wards(self.path)
+
+
+class WardStoreTests(TestCase):
+    def setUp(self):
+        scraperwiki.sqlite.execute("DROP TABLE IF EXISTS lgbce_wards;")
+        scraperwiki.sqlite.execute("DROP TABLE IF EXISTS lgbce_ward_summaries;")
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_save(self):
+        path = os.path.join(self.dir, "final.zip")
+        with zipfile.ZipFile(path, "w") as zf:
+            zf.writestr("wards.shp", make_shp([[SQUARE], [RECTANGLE]]))
+            zf.writestr("wards.dbf", make_dbf([("NAME", 10)], [("A",), ("B",)]))
+
+        store = WardStore()
+        store.save("tewkesbury", "abc123", read_wards(path))
+        # saving again should replace the wards, not duplicate them
+        store.save("tewkesbury", "abc123", read_wards(path))
+
+        summary = store.get_summary("tewkesbury")
+        self.assertEqual(2, summary["ward_count"])
+        self.assertEqual("abc123", summary["sha256"])
+        self.assertEqual(30, summary["max_x"])
+        wards = scraperwiki.sql.select(
+            "name, area FROM lgbce_wards WHERE slug=? ORDER BY name", "tewkesbury"
+        )
+        self.assertEqual(
+            [{"name": "A", "area": 100.0}, {"name": "B", "area": 30.0}], wards
+        )